@@ -0,0 +1,204 @@
+"""Headless benchmark of the work each dashboard tab does on a rerun.
+
+Generates synthetic raw Olist tables at each requested scale with
+``synthetic_data.py``, builds a temporary Parquet store from them with
+``pipeline.py`` and times, per tab, the same load, filter, aggregate and
+render steps ``dashboard.py`` performs:
+
+    python benchmarks/bench_dashboard.py --sizes 100000 1000000 10000000 --output bench.json
+
+Every stage reports wall time, resident memory (RSS) before/after and the
+process peak RSS. ``--allocations`` additionally traces Python/NumPy
+allocations with tracemalloc (slower, so off by default). Results are written
+as JSON for tracking regressions between commits.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "dashboard"))
+
+import cube  # noqa: E402
+import data_store  # noqa: E402
+import figures  # noqa: E402
+import geo  # noqa: E402
+import pipeline  # noqa: E402
+import quantile_sketch  # noqa: E402
+import rfm  # noqa: E402
+import synthetic_data  # noqa: E402
+from instrumentation import current_rss, peak_rss  # noqa: E402
+
+DEFAULT_SIZES = [100_000, 1_000_000, 10_000_000]
+
+
+@contextmanager
+def measure(results, orders, tab, stage, allocations=False):
+    gc.collect()
+    if allocations:
+        tracemalloc.start()
+    try:
+        rss_before = current_rss()
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        record = {
+            "orders": orders,
+            "tab": tab,
+            "stage": stage,
+            "wall_seconds": round(wall, 6),
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": current_rss(),
+            "peak_rss_bytes": peak_rss(),
+            "allocated_net_bytes": None,
+            "allocated_peak_bytes": None,
+        }
+        if allocations:
+            record["allocated_net_bytes"], record["allocated_peak_bytes"] = tracemalloc.get_traced_memory()
+        results.append(record)
+    finally:
+        # A failing stage must not leave tracing on for the stages after it
+        if allocations:
+            tracemalloc.stop()
+
+
+def build_store(orders, work_path, results, allocations=False):
+    """Generate ``orders`` raw synthetic orders under ``work_path`` and build the store with the pipeline."""
+    source_path, store_path = Path(work_path) / "raw", Path(work_path) / "store"
+    with measure(results, orders, "setup", "generate_raw", allocations):
+        synthetic_data.generate(orders, source_path)
+    with measure(results, orders, "setup", "pipeline", allocations):
+        pipeline.run(source_path, store_path)
+    # The pipeline already stored a cube, build it again on its own to time it
+    with measure(results, orders, "setup", "build_cube", allocations):
+        data_cube = cube.build_cube(store_path)
+        cube.write_cube(data_cube, store_path)
+    return store_path, data_cube
+
+
+def bench_tabs(orders, store_path, data_cube, results, allocations=False):
+    def stage(tab, name):
+        return measure(results, orders, tab, name, allocations)
+
+    # Tab 1: delivery time for the selected order statuses
+    with stage("tab1", "load"):
+        all_data = data_store.read_dataset("all_data", columns=["order_status", "delivery_time_days"],
+                                           store_path=store_path)
+    statuses = ["delivered", "shipped"]
+    with stage("tab1", "filter_isin"):
+        delivery = all_data.loc[all_data["order_status"].isin(statuses), "delivery_time_days"].dropna()
+    with stage("tab1", "cube_lookup"):
+        delivery_counts = cube.delivery_counts(data_cube, statuses)
+        delivery_edges = cube.delivery_bin_edges(data_cube)
+        delivery_bins = cube.delivery_histogram(delivery_counts, delivery_edges)
+        cube.delivery_summary(delivery_counts)
+    with stage("tab1", "render"):
+        figures.render_figure(figures.delivery_histogram(delivery_bins, delivery_edges))
+    del all_data, delivery
+
+    # Tab 2: recency of every customer
+    with stage("tab2", "load"):
+        rfm.read_rfm(columns=["recency"], store_path=store_path)
+    with stage("tab2", "cube_lookup"):
+        recency_counts = cube.recency_counts(data_cube)
+    with stage("tab2", "render"):
+        figures.render_figure(figures.recency_histogram(recency_counts))
+
+    # Tab 3: purchase frequency in Q3 2018
+    with stage("tab3", "load_filtered"):
+        rfm.read_rfm(columns=["frequency"], years=[2018], quarters=[3], store_path=store_path)
+    with stage("tab3", "cube_lookup"):
+        frequency_counts = cube.frequency_counts(data_cube, [2018], [3])
+    with stage("tab3", "render"):
+        figures.render_figure(figures.frequency_histogram(frequency_counts, "2018", "3"))
+
+    # Tab 4: expenditure box plot for 2018
+    with stage("tab4", "load_filtered"):
+        monetary = rfm.read_rfm(columns=["monetary"], years=[2018], store_path=store_path)["monetary"]
+    with stage("tab4", "exact_quartiles"):
+        monetary.quantile([0.25, 0.5, 0.75])
+    with stage("tab4", "cube_lookup"):
+        box_stats = quantile_sketch.sketch_boxplot_stats(cube.monetary_sketch(data_cube, [2018]))
+    with stage("tab4", "render"):
+        figures.render_figure(figures.expenditure_boxplot(box_stats, "2018"))
+
+    # Tab 5: purchases per state and the choropleth
+    with stage("tab5", "load"):
+        all_data = data_store.read_dataset("all_data", columns=["customer_state", "order_id"],
+                                           store_path=store_path)
+    with stage("tab5", "groupby_state"):
+        all_data.groupby("customer_state", observed=True)["order_id"].count()
+    del all_data
+    with stage("tab5", "cube_lookup"):
+        state_purchases = cube.state_purchases(data_cube)
+    with stage("tab5", "geojson_merge"):
+        geo.join_purchases(geo.load_states(), dict(zip(state_purchases["state"],
+                                                       state_purchases["total_purchases"])))
+    with stage("tab5", "render_map"):
+        geo.render_purchase_map(state_purchases)
+    with stage("tab5", "drilldown_index"):
+        drilldown = cube.drilldown_index(data_cube)
+    with stage("tab5", "drilldown_lookup"):
+        cube.state_drilldown(drilldown, "SP")
+
+    # Tab 6: customer segmentation for 2018
+    with stage("tab6", "load_filtered"):
+        all_data = data_store.read_dataset("all_data", columns=["customer_unique_id"], years=[2018],
+                                           store_path=store_path)
+    with stage("tab6", "groupby_customer"):
+        all_data.groupby("customer_unique_id").size().value_counts()
+    del all_data
+    with stage("tab6", "cube_lookup"):
+        segment_counts = cube.segment_counts(cube.frequency_counts(data_cube, [2018]))
+    with stage("tab6", "render"):
+        figures.render_figure(figures.segmentation_chart(segment_counts, "2018"))
+
+
+def run(sizes, allocations=False):
+    results = []
+    for orders in sizes:
+        with tempfile.TemporaryDirectory() as work_path:
+            store_path, data_cube = build_store(orders, work_path, results, allocations)
+            bench_tabs(orders, store_path, data_cube, results, allocations)
+        gc.collect()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's per-tab work on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of orders to test")
+    parser.add_argument("--allocations", action="store_true", help="Trace allocations with tracemalloc")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.allocations)
+    report = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for record in results:
+        print(f"{record['orders']:>10} {record['tab']:<6} {record['stage']:<18} "
+              f"{record['wall_seconds']:>9.4f}s  rss {record['rss_after_bytes'] / 2 ** 20:>8.1f} MiB",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Load test of one dashboard server process with concurrent simulated users.
+
+Every simulated user is a Streamlit ``AppTest`` session of
+``dashboard/dashboard.py`` running in its own thread of this process, so the
+sessions share the process's caches, GIL and render workers like the sessions
+of one ``streamlit run`` server:
+
+    python benchmarks/load_test.py --users 1 2 4 8 16 --rounds 2 --output load.json
+
+Each user opens the app and works through the widget scripts of ``SCENARIOS``
+in a shuffled order: tab1 order statuses, tab3 years and quarters, tab4 and
+tab6 years and a tab5 state drill-down, with seeded random selections. Every
+widget change is one timed rerun. For each number of concurrent users the test
+reports
+
+* p50/p95/p99 rerun latency and the throughput in reruns per second
+* the peak resident memory (RSS) of this process and of the render workers
+* with ``--trace``, the p50/p95 and total time of every stage of the
+  dashboard's debug trace (cube lookups, chart rendering, map building, ...),
+  to show which stage dominates as the load grows. The trace and its sidebar
+  panel add work to every rerun, so it is off unless asked for
+
+The data is the dashboard's own store and caches stay warm between levels,
+as in a long-running server. AppTest reruns the whole script on a widget
+change where the browser reruns only the view's fragment, so the latencies
+are those of full reruns, an upper bound.
+
+Running several AppTest sessions at once relies on patching Streamlit
+internals (see ``share_runtime``), which is only done on the Streamlit release
+it was written against, ``TESTED_STREAMLIT``. Other releases can still run
+single-user levels.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+DASHBOARD_PATH = Path(__file__).resolve().parent.parent / "dashboard"
+sys.path.insert(0, str(DASHBOARD_PATH))
+
+import cube  # noqa: E402
+from instrumentation import CACHE_STATS, current_rss  # noqa: E402
+
+APP_PATH = DASHBOARD_PATH / "dashboard.py"
+DEFAULT_USERS = [1, 2, 4, 8]
+
+# Streamlit release whose internals share_runtime patches
+TESTED_STREAMLIT = "1.38."
+
+# Interval between two memory samples
+MEMORY_SAMPLE_SECONDS = 0.05
+
+
+def process_rss(pid):
+    """Resident set size of another process in bytes, 0 once it has exited."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+
+class MemorySampler:
+    """Samples the RSS of this process and of its worker processes in a thread, keeping the peaks."""
+
+    def __init__(self, interval=MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_worker_rss = 0
+        self.workers = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def sample(self):
+        children = multiprocessing.active_children()
+        self.workers = max(self.workers, len(children))
+        self.peak_rss = max(self.peak_rss, current_rss())
+        self.peak_worker_rss = max(self.peak_worker_rss, sum(process_rss(child.pid) for child in children))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def _subset(rng, options, fewest=1):
+    return rng.sample(options, rng.randint(fewest, len(options)))
+
+
+# Widget scripts of the simulated users: each takes the AppTest, a seeded random.Random, the filter
+# options and a number of steps, and yields (step, change) where change sets the widgets of one rerun
+
+def status_changes(at, rng, options, steps):
+    """Tab 1: order status selections, mostly with the delivered orders."""
+    for step in range(steps):
+        statuses = _subset(rng, options["statuses"])
+        if "delivered" in options["statuses"] and rng.random() < 0.8 and "delivered" not in statuses:
+            statuses.append("delivered")
+        yield f"statuses_{step}", lambda: at.multiselect(key="order_status_tab1").set_value(statuses)
+
+
+def period_changes(at, rng, options, steps):
+    """Tab 3: years, then quarters, as two separate changes."""
+    for step in range(steps):
+        years = _subset(rng, options["years"])
+        quarters = _subset(rng, [1, 2, 3, 4])
+        yield f"years_{step}", lambda: at.multiselect(key="year_selection_tab3").set_value(years)
+        yield f"quarters_{step}", lambda: at.multiselect(key="quarter_selection_tab3").set_value(quarters)
+
+
+def year_changes(key):
+    def changes(at, rng, options, steps):
+        for step in range(steps):
+            years = _subset(rng, options["years"])
+            yield f"years_{step}", lambda: at.multiselect(key=key).set_value(years)
+    changes.__doc__ = f"Year selections of the ``{key}`` widget."
+    return changes
+
+
+def drilldown_changes(at, rng, options, steps):
+    """Tab 5: drill down into states, weighted like the purchases so the large states come up most."""
+    for step in range(steps):
+        state = rng.choices(options["states"], weights=options["state_weights"])[0]
+        yield f"state_{step}", lambda: at.selectbox(key="drilldown_state").set_value(state)
+
+
+SCENARIOS = {
+    "tab1": status_changes,
+    "tab3": period_changes,
+    "tab4": year_changes("year_selection_tab4"),
+    "tab5": drilldown_changes,
+    "tab6": year_changes("year_selection_tab6"),
+}
+
+
+def filter_options(store_path=None):
+    """The values the simulated users pick from, read from the cube the dashboard serves."""
+    data_cube = cube.read_cube(store_path)
+    state_purchases = cube.state_purchases(data_cube)
+    return {
+        "statuses": list(cube.order_statuses(data_cube)),
+        "years": [int(year) for year in cube.cube_years(data_cube)],
+        "states": state_purchases["state"].tolist(),
+        "state_weights": state_purchases["total_purchases"].tolist(),
+    }
+
+
+def share_runtime():
+    """Share one mock Streamlit runtime and script cache between all sessions, like a server does.
+
+    AppTest is made for one session at a time. It installs a mock runtime when
+    a run starts and removes it when the run ends, which breaks the runs of
+    the other sessions still going on in other threads; its per-run install
+    is pointed at a stand-in instead, and the ``global.appTest`` option it
+    patches around each run is set for good. Each of its runs also compiles
+    the script again, and compiling in several threads at once fails on
+    CPython 3.11, so the compiled script is cached once for every session.
+
+    These are private attributes of ``TESTED_STREAMLIT``; on any other release
+    this raises instead of patching blindly.
+    """
+    if not st.__version__.startswith(TESTED_STREAMLIT):
+        raise RuntimeError(
+            f"Concurrent users need Streamlit {TESTED_STREAMLIT}x, whose internals this load test patches; "
+            f"found {st.__version__}. Run with --users 1, or update share_runtime for this release.")
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = types.SimpleNamespace(_instance=None)
+    config.set_option("global.appTest", True)
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+def new_session(timeout, interactive=False, trace=False):
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    if trace:
+        # The debug trace records the stages of every rerun in the session state
+        at.query_params["debug"] = "1"
+    if interactive:
+        at.query_params["charts"] = "interactive"
+    return at
+
+
+def timed_run(at, records, user, view, step):
+    start = time.perf_counter()
+    at.run()
+    latency = time.perf_counter() - start
+    history = at.session_state["profile_history"] if "profile_history" in at.session_state else []
+    records.append({
+        "user": user,
+        "view": view,
+        "step": step,
+        "started_at": start,
+        "latency_seconds": latency,
+        "errors": [str(exception.value) for exception in at.exception],
+        "spans": [{"tab": span["tab"], "stage": span["stage"], "wall_seconds": span["wall_seconds"]}
+                  for span in (history[-1]["spans"] if history else [])],
+    })
+
+
+def simulate_user(user, options, scenarios, rounds, steps, timeout, interactive, trace, records, barrier):
+    rng = random.Random(user)
+    at = new_session(timeout, interactive, trace)
+    barrier.wait()
+    try:
+        timed_run(at, records, user, "tab1", "open")
+        for _ in range(rounds):
+            for view in rng.sample(scenarios, len(scenarios)):
+                at.radio(key="view").set_value(view)
+                timed_run(at, records, user, view, "switch_view")
+                for step, change in SCENARIOS[view](at, rng, options, steps):
+                    change()
+                    timed_run(at, records, user, view, step)
+    except Exception as error:  # a failed session is reported, the other users carry on
+        records.append({"user": user, "view": None, "step": "session", "started_at": time.perf_counter(),
+                        "latency_seconds": None, "errors": [repr(error)], "spans": []})
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2)}
+
+
+def stage_summary(records):
+    """p50/p95 and total wall time of every traced stage, the most expensive first."""
+    stages = {}
+    for record in records:
+        for span in record["spans"]:
+            stages.setdefault((span["tab"], span["stage"]), []).append(span["wall_seconds"])
+    summary = [{"tab": tab, "stage": stage, "count": len(walls), "total_seconds": round(sum(walls), 4),
+                **_percentiles(walls)} for (tab, stage), walls in stages.items()]
+    return sorted(summary, key=lambda row: row["total_seconds"], reverse=True)
+
+
+def run_level(users, options, scenarios, rounds, steps, timeout, interactive, trace=False):
+    """Run ``users`` simulated users at once and summarize their reruns."""
+    records = []
+    barrier = threading.Barrier(users + 1)
+    threads = [threading.Thread(target=simulate_user, name=f"user-{user}",
+                                args=(user, options, scenarios, rounds, steps, timeout, interactive,
+                                      trace, records, barrier))
+               for user in range(users)]
+    cache_calls = {row["function"]: row for row in CACHE_STATS.snapshot()}
+    with MemorySampler() as memory:
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    reruns = [record for record in records if record["latency_seconds"] is not None]
+    latencies = [record["latency_seconds"] for record in reruns]
+    caches = []
+    for row in CACHE_STATS.snapshot():
+        before = cache_calls.get(row["function"], {"calls": 0, "misses": 0})
+        caches.append({"function": row["function"], "calls": row["calls"] - before["calls"],
+                       "misses": row["misses"] - before["misses"]})
+    return {
+        "users": users,
+        "reruns": len(reruns),
+        "errors": sum(len(record["errors"]) for record in records),
+        "wall_seconds": round(wall, 4),
+        "throughput_reruns_per_second": round(len(reruns) / wall, 3) if wall else None,
+        **_percentiles(latencies),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        "peak_rss_bytes": memory.peak_rss,
+        "peak_worker_rss_bytes": memory.peak_worker_rss,
+        "worker_processes": memory.workers,
+        "stages": stage_summary(reruns),
+        "caches": caches,
+        "records": records,
+    }
+
+
+def run(levels, scenarios=tuple(SCENARIOS), rounds=1, steps=3, timeout=120, interactive=False, trace=False,
+        store_path=None):
+    # A single session at a time runs on AppTest as it is
+    if max(levels) > 1:
+        share_runtime()
+    options = filter_options(store_path)
+    # One session first, so loading the data snapshot and starting the render workers is not measured
+    start = time.perf_counter()
+    warmup = new_session(timeout, interactive, trace).run()
+    startup = time.perf_counter() - start
+    if warmup.exception:
+        raise RuntimeError(f"The dashboard failed to start: {warmup.exception[0].value}")
+    return startup, [run_level(users, options, list(scenarios), rounds, steps, timeout, interactive, trace)
+                     for users in levels]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent simulated users.")
+    parser.add_argument("--users", type=int, nargs="+", default=DEFAULT_USERS,
+                        help="Numbers of concurrent users to test, one level each")
+    parser.add_argument("--views", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="Views whose widget scripts the users run")
+    parser.add_argument("--rounds", type=int, default=1, help="Times each user works through the views")
+    parser.add_argument("--steps", type=int, default=3, help="Widget changes per view and round")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds a single rerun may take")
+    parser.add_argument("--interactive", action="store_true", help="Use the interactive (Plotly) charts")
+    parser.add_argument("--trace", action="store_true",
+                        help="Turn on the dashboard's debug trace and report the time spent in each stage")
+    parser.add_argument("--records", action="store_true", help="Include every rerun in the JSON output")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    startup, levels = run(args.users, args.views, args.rounds, args.steps, args.timeout, args.interactive,
+                          args.trace)
+    if not args.records:
+        for level in levels:
+            del level["records"]
+    report = {
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "platform": platform.platform(),
+        "cpus": multiprocessing.cpu_count(),
+        "startup_seconds": round(startup, 4),
+        "levels": levels,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    print(f"startup {startup:.2f}s", file=sys.stderr)
+    for level in levels:
+        print(f"{level['users']:>4} users {level['reruns']:>5} reruns {level['errors']:>3} errors "
+              f"{level['throughput_reruns_per_second']:>7.2f}/s  p50 {level['p50_ms']:>8.1f} ms  "
+              f"p95 {level['p95_ms']:>8.1f} ms  p99 {level['p99_ms']:>8.1f} ms  "
+              f"rss {level['peak_rss_bytes'] / 2 ** 20:>7.1f} MiB  "
+              f"workers {level['peak_worker_rss_bytes'] / 2 ** 20:>7.1f} MiB", file=sys.stderr)
+        for stage in level["stages"][:5]:
+            print(f"{'':>10}{stage['tab']:<6} {stage['stage']:<16} {stage['total_seconds']:>8.2f}s total  "
+                  f"p50 {stage['p50_ms']:>8.1f} ms  p95 {stage['p95_ms']:>8.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""Pre-aggregated cube behind the dashboard filters.
+
+Every widget change used to re-filter and re-group the full ``all_data`` and
+``rfm_data`` frames. The cube stores small aggregates instead, keyed by
+``year``/``quarter`` (and ``order_status``/``customer_state`` for order
+rows), so a filter only sums the matching slices:
+
+* ``orders``: number of order rows per (year, quarter, order_status, customer_state)
+* ``delivery``: order rows per delivery time in days, same keys
+* ``recency``: customers per recency, by (year, quarter)
+* ``monetary``: a mergeable quantile sketch of customer spend, by (year, quarter)
+* ``customer_orders``: the customer frequency index, the number of orders of
+  every customer per (year, quarter), with customers as integer codes
+* ``state_cities`` / ``state_zip_prefixes`` / ``state_sellers`` /
+  ``state_categories``: order rows and item revenue per customer state and
+  city, zip code prefix, seller and product category, behind the tab5
+  drill-down. The order rows only carry seller and product ids: they are
+  aggregated per id and the seller's city and state and the product category
+  are joined from the ``data/`` reference tables afterwards. A drill-down
+  table is left out when all_data lacks its columns (e.g. the CSV fallback
+  without item prices) or its reference table is missing
+
+The purchase frequency (tab3) and customer segmentation (tab6) views both
+read the customer frequency index: the order counts of the selected periods
+are summed per customer with ``np.bincount`` and counted again, so a customer
+buying in several selected quarters or years is counted once, with all of
+their orders, for any combination of periods.
+
+Delivery time, recency and frequency are whole numbers, so drawing a histogram
+from their value counts (``hist(values, weights=counts)``) gives exactly the
+same bars as drawing it from the raw rows. The per-day delivery counts are the
+finest fixed-edge bins: the tab1 histogram sums them into fixed bins spanning
+the delivery times of every status, and its summary statistics are exact
+quantiles of the same counts.
+
+After ``pipeline.py --append``, ``update_cube`` folds the new orders into the
+stored cube: only the (year, quarter) slices the batch falls in are
+recomputed, from the batch and the rewritten rfm_data partitions. Recency is
+the exception, every customer's recency moves with the new reference date, so
+that table is recomputed from the (narrow) recency column of rfm_data. The
+stored ``customer_codes`` table keeps the customer numbering of the frequency
+index stable across updates, new customers get the next free codes.
+
+Build and store the cube with::
+
+    python dashboard/cube.py [--engine duckdb]
+
+The ``duckdb`` engine (see ``query_engine.py``) aggregates the Parquet store
+in SQL on every core, and is the default when ``DASHBOARD_ENGINE=duckdb``.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import quantile_sketch
+import query_engine
+from rfm import read_rfm
+
+ORDER_KEYS = ["year", "quarter", "order_status", "customer_state"]
+
+# Number of bars of the tab1 delivery time histogram
+DELIVERY_BINS = 15
+
+# Customer segments of tab6 by number of purchases: (name, fewest, most)
+SEGMENTS = [("Low", 1, 1), ("Medium", 2, 3), ("High", 4, 10), ("Very High", 11, None)]
+PERIOD_KEYS = ["year", "quarter"]
+
+# Drill-down breakdowns of the tab5 map: table name -> columns it breaks a customer state down by
+DRILLDOWN_TABLES = {
+    "state_cities": ["customer_city"],
+    "state_zip_prefixes": ["customer_zip_code_prefix"],
+    "state_sellers": ["seller_id", "seller_city", "seller_state"],
+    "state_categories": ["product_category_name_english"],
+}
+DRILLDOWN_VALUES = ["orders", "revenue"]
+# The all_data column each drill-down table is aggregated on before its details are joined
+DRILLDOWN_KEYS = {
+    "state_cities": "customer_city",
+    "state_zip_prefixes": "customer_zip_code_prefix",
+    "state_sellers": "seller_id",
+    "state_categories": "product_id",
+}
+# Reference tables the seller and category details are joined from
+DRILLDOWN_REFERENCES = {"state_sellers": "olist_sellers_dataset", "state_categories": "olist_products_dataset"}
+
+# Table name -> (key columns, value column(s))
+CUBE_TABLES = {
+    "orders": (ORDER_KEYS, "orders"),
+    "delivery": (ORDER_KEYS + ["delivery_time_days"], "orders"),
+    "recency": (PERIOD_KEYS + ["recency"], "customers"),
+    "monetary": (PERIOD_KEYS + ["bucket"], "customers"),
+    "customer_orders": (PERIOD_KEYS + ["customer"], "orders"),
+    **{table: (["customer_state"] + columns, DRILLDOWN_VALUES) for table, columns in DRILLDOWN_TABLES.items()},
+}
+
+ALL_DATA_COLUMNS = ["order_status", "customer_state", "delivery_time_days", "order_purchase_timestamp"]
+RFM_DATA_COLUMNS = ["customer_unique_id", "recency", "frequency", "monetary", "year", "quarter"]
+
+# customer_unique_id of every customer code of the frequency index, in code order. Stored with
+# the cube for update_cube, but not read by the dashboard
+CUSTOMER_CODES = "customer_codes"
+
+# One row per customer and quarter, so the index is kept in narrow types
+CUSTOMER_ORDERS_DTYPES = {"year": "int16", "quarter": "int8", "customer": "int32", "orders": "int32"}
+
+
+def cube_path(store_path=None):
+    return data_store.dataset_path("cube", store_path)
+
+
+def _sum(partials, keys, values):
+    values = [values] if isinstance(values, str) else values
+    partials = [partial for partial in partials if len(partial)]
+    if not partials:
+        return pd.DataFrame(columns=keys + values)
+    combined = pd.concat(partials, ignore_index=True)
+    return combined.groupby(keys, observed=True, dropna=False)[values].sum().reset_index()
+
+
+def _combine(partials, table):
+    keys, values = CUBE_TABLES[table]
+    return _sum(partials, keys, values)
+
+
+def drilldown_sources(store_path=None):
+    """The drill-down tables that can be built from the columns of all_data and the reference tables present."""
+    columns = set(data_store.dataset_columns("all_data", store_path))
+    if not {"customer_state", "price"} <= columns:
+        return []
+    return [table for table, key in DRILLDOWN_KEYS.items()
+            if key in columns and data_store.dataset_exists(DRILLDOWN_REFERENCES.get(table, "all_data"), store_path)]
+
+
+def drilldown_columns(tables):
+    """The all_data columns read for the drill-down ``tables``."""
+    return list(dict.fromkeys(["price"] + [DRILLDOWN_KEYS[table] for table in tables])) if tables else []
+
+
+def _order_aggregates(frame, drilldown_tables=()):
+    if "year" not in frame.columns:
+        frame = data_store.add_partition_columns(frame, "all_data")
+    frame = frame.astype({"year": "int64", "quarter": "int64"})
+    orders = frame.groupby(ORDER_KEYS, observed=True).size().rename("orders").reset_index()
+    delivered = frame.dropna(subset=["delivery_time_days"])
+    delivery = delivered.groupby(ORDER_KEYS + ["delivery_time_days"], observed=True).size()
+    # Order rows and item revenue per state and city, zip prefix, seller id and product id; missing
+    # keys (e.g. orders without items) are kept so each table adds up to the state total
+    drilldown = {
+        table: frame.groupby(["customer_state", DRILLDOWN_KEYS[table]], observed=True, dropna=False)["price"]
+                    .agg(orders="size", revenue="sum").reset_index()
+        for table in drilldown_tables
+    }
+    return orders, delivery.rename("orders").reset_index(), drilldown
+
+
+def drilldown_details(aggregates, store_path=None):
+    """The drill-down cube tables from the per-key aggregates, with seller and category details joined in.
+
+    The reference tables are joined to the aggregates, which hold one row per
+    state and seller or product, rather than to every order row.
+    """
+    tables = {}
+    for table, frame in aggregates.items():
+        if table == "state_sellers":
+            sellers = data_store.read_dataset("olist_sellers_dataset", columns=DRILLDOWN_TABLES[table],
+                                              store_path=store_path)
+            frame = frame.merge(sellers.drop_duplicates("seller_id"), on="seller_id", how="left")
+        elif table == "state_categories":
+            products = data_store.read_products(store_path).drop_duplicates("product_id")
+            if "product_category_name_english" not in products.columns:
+                # No translation table: show the original category names
+                products = products.rename(columns={"product_category_name": "product_category_name_english"})
+            frame = frame.merge(products[["product_id", "product_category_name_english"]], on="product_id",
+                                how="left")
+        tables[table] = _combine([frame], table)
+    return tables
+
+
+def _rfm_periods(frame):
+    return frame.dropna(subset=["year", "quarter"]).astype({"year": "int64", "quarter": "int64"})
+
+
+def _recency_counts(frame):
+    return frame.groupby(PERIOD_KEYS + ["recency"]).size().rename("customers").reset_index()
+
+
+def _monetary_buckets(frame):
+    monetary = frame.assign(bucket=quantile_sketch.bucket_index(frame["monetary"]))
+    return monetary.groupby(PERIOD_KEYS + ["bucket"]).size().rename("customers").reset_index()
+
+
+def _customer_orders(frame, customers):
+    # rfm_data already holds the distinct orders per customer and quarter, merged at ingest
+    customer_orders = pd.DataFrame({
+        "year": frame["year"],
+        "quarter": frame["quarter"],
+        "customer": customers,
+        "orders": frame["frequency"],
+    })
+    return customer_orders.astype(CUSTOMER_ORDERS_DTYPES)
+
+
+def _rfm_aggregates(frame):
+    frame = _rfm_periods(frame)
+    customers, customer_ids = pd.factorize(frame["customer_unique_id"])
+    customer_codes = pd.DataFrame({"customer_unique_id": customer_ids})
+    return _recency_counts(frame), _monetary_buckets(frame), _customer_orders(frame, customers), customer_codes
+
+
+def build_cube(store_path=None, engine=None):
+    """Aggregate all_data and rfm_data into the cube tables in one chunked pass over each.
+
+    ``engine`` is "pandas" or "duckdb", by default ``query_engine.default_engine()``.
+    DuckDB needs the Parquet store; without it the pandas engine is used.
+    """
+    engine = engine or query_engine.default_engine()
+    drilldown_tables = drilldown_sources(store_path)
+    if engine == "duckdb" and query_engine.available(store_path):
+        orders, delivery = query_engine.order_aggregates(store_path)
+        recency, monetary, customer_orders = query_engine.rfm_aggregates(store_path)
+        drilldown = query_engine.drilldown_aggregates(
+            {table: DRILLDOWN_KEYS[table] for table in drilldown_tables}, store_path)
+        customer_codes = (customer_orders.drop_duplicates("customer").sort_values("customer")
+                          [["customer_unique_id"]].reset_index(drop=True))
+        return {
+            "orders": orders,
+            "delivery": delivery,
+            "recency": recency,
+            "monetary": monetary,
+            "customer_orders": customer_orders.drop(columns="customer_unique_id").astype(CUSTOMER_ORDERS_DTYPES),
+            **drilldown_details(drilldown, store_path),
+            CUSTOMER_CODES: customer_codes,
+        }
+
+    orders, delivery, drilldown = [], [], {table: [] for table in drilldown_tables}
+    columns = ALL_DATA_COLUMNS + drilldown_columns(drilldown_tables)
+    for frame in data_store.iter_dataset("all_data", columns=columns, store_path=store_path):
+        partial_orders, partial_delivery, partial_drilldown = _order_aggregates(frame, drilldown_tables)
+        orders.append(partial_orders)
+        delivery.append(partial_delivery)
+        for table, partial in partial_drilldown.items():
+            drilldown[table].append(partial)
+
+    recency, monetary, customer_orders, customer_codes = _rfm_aggregates(
+        read_rfm(columns=RFM_DATA_COLUMNS, store_path=store_path))
+
+    return {
+        "orders": _combine(orders, "orders"),
+        "delivery": _combine(delivery, "delivery"),
+        "recency": recency,
+        "monetary": monetary,
+        "customer_orders": customer_orders,
+        **drilldown_details({table: _sum(partials, ["customer_state", DRILLDOWN_KEYS[table]], DRILLDOWN_VALUES)
+                             for table, partials in drilldown.items()}, store_path),
+        CUSTOMER_CODES: customer_codes,
+    }
+
+
+def _in_periods(frame, periods):
+    """Mask of the rows of ``frame`` in one of the (year, quarter) pairs of ``periods``."""
+    return pd.MultiIndex.from_frame(frame[PERIOD_KEYS].astype("int64")).isin(
+        pd.MultiIndex.from_frame(periods[PERIOD_KEYS].astype("int64")))
+
+
+def _replace_periods(frame, periods, updated):
+    return pd.concat([frame[~_in_periods(frame, periods)], updated], ignore_index=True)
+
+
+def update_cube(batch, store_path=None):
+    """Fold a batch of new joined order rows into the stored cube, returning the updated cube.
+
+    Call it after the batch has been appended to all_data and merged into
+    rfm_data (see ``pipeline.append``). The orders, delivery, monetary and
+    customer_orders slices of the (year, quarter) pairs in the batch are
+    recomputed from the batch and the rewritten rfm_data partitions, the
+    drill-down tables are summed with the batch's, and recency is recomputed
+    for every period. Without a stored cube (or with one from an older
+    layout) the cube is rebuilt instead.
+    """
+    root = cube_path(store_path)
+    drilldown_tables = drilldown_sources(store_path)
+    stored = ([table for table in CUBE_TABLES if table not in DRILLDOWN_TABLES or table in drilldown_tables]
+              + [CUSTOMER_CODES])
+    if not all((root / f"{table}.parquet").exists() for table in stored):
+        data_cube = build_cube(store_path)
+        write_cube(data_cube, store_path)
+        return data_cube
+    data_cube = read_cube(store_path)
+    customer_ids = pd.read_parquet(root / f"{CUSTOMER_CODES}.parquet")["customer_unique_id"]
+
+    columns = [column for column in ALL_DATA_COLUMNS + drilldown_columns(drilldown_tables) if column in batch.columns]
+    orders, delivery, drilldown = _order_aggregates(batch[columns].copy(), drilldown_tables)
+    periods = orders[PERIOD_KEYS].drop_duplicates()
+    for table, partial in (("orders", orders), ("delivery", delivery)):
+        existing = data_cube[table][_in_periods(data_cube[table], periods)]
+        data_cube[table] = _replace_periods(data_cube[table], periods, _combine([existing, partial], table))
+    # The drill-down tables have no period key, the batch's rows are added to them
+    for table, details in drilldown_details(drilldown, store_path).items():
+        data_cube[table] = _combine([data_cube[table], details], table)
+
+    # The touched rfm_data partitions hold the merged customers of those quarters
+    rfm = read_rfm(columns=["customer_unique_id", "frequency", "monetary", "year", "quarter"],
+                   years=periods["year"].unique(), quarters=periods["quarter"].unique(), store_path=store_path)
+    rfm = _rfm_periods(rfm)
+    rfm = rfm[_in_periods(rfm, periods)]
+    new_ids = rfm["customer_unique_id"][~rfm["customer_unique_id"].isin(customer_ids)].unique()
+    customer_ids = pd.concat([customer_ids, pd.Series(new_ids, name="customer_unique_id")], ignore_index=True)
+    customers = pd.Index(customer_ids).get_indexer(rfm["customer_unique_id"])
+    data_cube["monetary"] = _replace_periods(data_cube["monetary"], periods, _monetary_buckets(rfm))
+    data_cube["customer_orders"] = _replace_periods(data_cube["customer_orders"], periods,
+                                                    _customer_orders(rfm, customers))
+
+    data_cube["recency"] = _recency_counts(_rfm_periods(read_rfm(columns=PERIOD_KEYS + ["recency"],
+                                                                 store_path=store_path)))
+    data_cube[CUSTOMER_CODES] = customer_ids.to_frame()
+    write_cube(data_cube, store_path)
+    return data_cube
+
+
+def write_cube(cube, store_path=None):
+    root = cube_path(store_path)
+    root.mkdir(parents=True, exist_ok=True)
+    for table, frame in cube.items():
+        frame.to_parquet(root / f"{table}.parquet", index=False)
+    # Tables of an older cube layout are no longer read
+    for path in root.glob("*.parquet"):
+        if path.stem not in cube:
+            path.unlink()
+
+
+def read_cube(store_path=None):
+    """Read the stored cube, building it from the data when it has not been stored yet.
+
+    The drill-down tables are optional, a cube built without them is read as it is.
+    """
+    root = cube_path(store_path)
+    if not all((root / f"{table}.parquet").exists() for table in CUBE_TABLES if table not in DRILLDOWN_TABLES):
+        return {table: frame for table, frame in build_cube(store_path).items() if table in CUBE_TABLES}
+    return {table: pd.read_parquet(root / f"{table}.parquet") for table in CUBE_TABLES
+            if (root / f"{table}.parquet").exists()}
+
+
+def cube_years(cube, table="customer_orders"):
+    return sorted(int(year) for year in cube[table]["year"].unique())
+
+
+def order_statuses(cube):
+    return list(cube["orders"].groupby("order_status", observed=True)["orders"].sum().index)
+
+
+def delivery_counts(cube, statuses):
+    """Order rows per delivery time (days) for the selected order statuses."""
+    delivery = cube["delivery"]
+    delivery = delivery[delivery["order_status"].isin(statuses)]
+    return delivery.groupby("delivery_time_days")["orders"].sum()
+
+
+def delivery_bin_edges(cube, bins=DELIVERY_BINS):
+    """Histogram edges over the delivery times of all statuses, so the bars keep their place for any selection."""
+    days = cube["delivery"]["delivery_time_days"]
+    if days.empty:
+        return np.linspace(0, 1, bins + 1)
+    return np.histogram_bin_edges([], bins=bins, range=(float(days.min()), float(days.max())))
+
+
+def delivery_histogram(delivery_counts, edges):
+    """Order counts per fixed histogram bin, summed from the per-day counts of ``delivery_counts``."""
+    bin_counts, _ = np.histogram(delivery_counts.index.to_numpy(dtype=float), bins=edges,
+                                 weights=delivery_counts.to_numpy())
+    return bin_counts
+
+
+def delivery_summary(delivery_counts):
+    """Mean and quartiles of delivery time (days) from order counts per delivery time."""
+    q1, median, q3, p90 = quantile_sketch.count_quantiles(delivery_counts, [0.25, 0.5, 0.75, 0.9])
+    mean = np.average(delivery_counts.index.to_numpy(dtype=float), weights=delivery_counts.to_numpy())
+    return {"mean": mean, "q1": q1, "median": median, "q3": q3, "p90": p90}
+
+
+def state_purchases(cube):
+    purchases = cube["orders"].groupby("customer_state", observed=True)["orders"].sum().reset_index()
+    purchases.columns = ["state", "total_purchases"]
+    return purchases.sort_values(by="total_purchases", ascending=False)
+
+
+def _period_mask(frame, years=None, quarters=None):
+    mask = pd.Series(True, index=frame.index)
+    if years is not None:
+        mask &= frame["year"].isin(years)
+    if quarters is not None:
+        mask &= frame["quarter"].isin(quarters)
+    return mask
+
+
+def recency_counts(cube, years=None, quarters=None):
+    recency = cube["recency"]
+    return recency[_period_mask(recency, years, quarters)].groupby("recency")["customers"].sum()
+
+
+def frequency_counts(cube, years=None, quarters=None):
+    """Customers per number of orders within the selected periods, from the customer frequency index.
+
+    Each customer's orders are summed across all selected years and quarters
+    before counting, so a customer appears once however many periods they bought in.
+    """
+    index = cube["customer_orders"]
+    selected = index[_period_mask(index, years, quarters)]
+    if selected.empty:
+        return pd.Series(dtype="int64", name="customers").rename_axis("frequency")
+    per_customer = np.bincount(selected["customer"].to_numpy(), weights=selected["orders"].to_numpy())
+    counts = np.bincount(per_customer[per_customer > 0].astype(np.int64))
+    frequency = np.flatnonzero(counts)
+    return pd.Series(counts[frequency], index=frequency, name="customers").rename_axis("frequency")
+
+
+def segment_counts(frequency_counts):
+    """Customers in each of ``SEGMENTS``, from customers per number of purchases."""
+    frequency = frequency_counts.index
+    counts = []
+    for _, fewest, most in SEGMENTS:
+        in_segment = frequency >= fewest
+        if most is not None:
+            in_segment &= frequency <= most
+        counts.append(int(frequency_counts[in_segment].sum()))
+    return counts
+
+
+def drilldown_index(cube):
+    """Split the drill-down tables by customer state, largest first, so a state's breakdowns are a lookup.
+
+    Empty when the cube was built without drill-down tables.
+    """
+    index = {}
+    for table in DRILLDOWN_TABLES:
+        if table not in cube:
+            continue
+        frame = cube[table].sort_values("orders", ascending=False, kind="stable")
+        index[table] = {state: rows.drop(columns="customer_state").reset_index(drop=True)
+                        for state, rows in frame.groupby("customer_state", observed=True, sort=False)}
+    return index
+
+
+def state_drilldown(index, state):
+    """The city, zip prefix, seller and category breakdowns of one customer state from ``drilldown_index``."""
+    breakdowns = {}
+    for table, columns in DRILLDOWN_TABLES.items():
+        rows = index.get(table, {}).get(state)
+        breakdowns[table] = rows if rows is not None else pd.DataFrame(columns=columns + DRILLDOWN_VALUES)
+    return breakdowns
+
+
+def monetary_sketch(cube, years=None, quarters=None):
+    monetary = cube["monetary"]
+    return monetary[_period_mask(monetary, years, quarters)].groupby("bucket")["customers"].sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the pre-aggregated cube used by the dashboard filters.")
+    parser.add_argument("--store", type=Path, default=data_store.STORE_PATH, help="Parquet store directory")
+    parser.add_argument("--engine", choices=query_engine.ENGINES, default=None,
+                        help=f"Aggregation engine (default: ${query_engine.ENGINE_ENV} or pandas)")
+    args = parser.parse_args()
+
+    cube = build_cube(args.store, engine=args.engine)
+    write_cube(cube, args.store)
+    for table, frame in cube.items():
+        print(f"{table}: {len(frame)} rows -> {cube_path(args.store) / f'{table}.parquet'}")
+
+
+if __name__ == "__main__":
+    main()
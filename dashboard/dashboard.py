@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.patches import Patch
 import seaborn as sns
-import plotly.express as px
-import folium
-from streamlit_folium import folium_static
-import json
+import streamlit.components.v1 as components
 from pathlib import Path
 import datetime
+import functools
+import cube
+from geo import GEOJSON_PATH, load_states, render_purchase_map
+import figures
+import plotly_figures
+from quantile_sketch import ALPHA as SKETCH_ALPHA, sketch_boxplot_stats
+from refresher import DataRefresher
+from instrumentation import RerunTrace, cached, debug_enabled, session_history, show_debug_panel
 
 # Set page configuration for a better look
 st.set_page_config(
@@ -21,25 +24,55 @@ st.set_page_config(
 # Define the data paths using pathlib for the current directory
 base_path = Path(__file__).parent  # Get the current script's directory
 
+# Upper bound on the memory held by rendered chart images
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
 
-# Load all_data.csv
-@st.cache_data
-def load_data():
-    file_path = base_path / "all_data.csv"  # Construct the full path to all_data.csv
-    return pd.read_csv(file_path)
 
+# Rendered chart images, shared by all sessions of this server process
+@cached(st.cache_resource)
+def figure_cache():
+    return figures.FigureCache(max_bytes=FIGURE_CACHE_BYTES)
 
-all_data = load_data()
 
+# Worker processes drawing the charts into the figure cache, so sessions render in parallel across cores
+@cached(st.cache_resource)
+def render_service():
+    return figures.RenderService(figure_cache()).start()
 
-# Load rfm_data.csv
-@st.cache_data
-def load_rfm_data():
-    file_path = base_path / "rfm_data.csv"  # Construct the full path to rfm_data.csv
-    return pd.read_csv(file_path)
 
+# The data served to every session: the read-only cube of one data version. A background thread
+# builds the next snapshot when the store changes and swaps it in, so new data is picked up without
+# a restart; the charts of older versions are dropped on the swap
+@cached(st.cache_resource)
+def data_refresher():
+    images = figure_cache()
+
+    # Chart keys are ((tab, filters..., data version), image format)
+    def drop_old_charts(snapshot):
+        images.discard(lambda key: key[0][-1] != snapshot.version)
+
+    return DataRefresher(on_swap=drop_old_charts).start()
+
+
+# Tolerance (in degrees) used to simplify the state boundaries of the tab5 map
+MAP_TOLERANCE = 0.01
+
+
+# Rows of each drill-down table shown for the selected state, largest first
+DRILLDOWN_ROWS = 50
+
+
+# Render the tab5 choropleth once per data version, purchase counts and tolerance,
+# every rerun reuses the same HTML string. Only the maps of the current and the previous
+# data version are kept, sessions still drawing the old snapshot during a swap reuse theirs
+@cached(st.cache_resource(max_entries=2))
+def load_purchase_map(state_purchases, version, tolerance=MAP_TOLERANCE):
+    return render_purchase_map(state_purchases, tolerance)
+
+
+# Shows the rendered map HTML and returns the last state clicked on it, see purchase_map/index.html
+purchase_map = components.declare_component("purchase_map", path=str(base_path / "purchase_map"))
 
-rfm_data = load_rfm_data()
 
 # Conclusion and Custom Styling
 conclusions = {
@@ -75,155 +108,183 @@ conclusions = {
     """
 }
 
-# Available years and quarters from the dataset
-available_years = sorted(rfm_data['year'].unique())
-available_quarters = sorted(rfm_data['quarter'].unique())
-
 # Main Page Title
 st.title("Brazilian E-Commerce Public Data Analysis")
 st.markdown(
     "This dashboard visualizes insights from Olist Brazilian E-Commerce Public Dataset using various visualizations.")
 
-# Tabs for Visualizations
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
-    ["📊 Delivery Time Analysis",
-     "🕒 Recency Distribution Analysis",
-     "📊 Customer Purchase Frequency",
-     "💸 Average Expenditure",
-     "🌍 Geographic Analysis",
-     "🧑 Customer Segmentation"])
+# Labels of the views, selected in the view router below
+VIEW_LABELS = {
+    "tab1": "📊 Delivery Time Analysis",
+    "tab2": "🕒 Recency Distribution Analysis",
+    "tab3": "📊 Customer Purchase Frequency",
+    "tab4": "💸 Average Expenditure",
+    "tab5": "🌍 Geographic Analysis",
+    "tab6": "🧑 Customer Segmentation",
+}
+
+# Default selections of the filter widgets of every view (Q3 2018 for the purchase frequency).
+# Only the active view's widgets are drawn, so their selections are written back to the session
+# state on each rerun to survive switching to another view and back
+VIEW_WIDGET_DEFAULTS = {
+    "order_status_tab1": cube.order_statuses(data_refresher().current().cube),
+    "year_selection_tab3": [2018],
+    "quarter_selection_tab3": [3],
+    "year_selection_tab4": [2018],
+    "year_selection_tab6": [2018],
+    "drilldown_state": None,
+}
+for widget_key, widget_default in VIEW_WIDGET_DEFAULTS.items():
+    st.session_state[widget_key] = st.session_state.get(widget_key, widget_default)
+
+# Interactive mode draws Plotly charts in the browser, so hovering and zooming need no rerun.
+# Start in it when the URL asks for it (?charts=interactive)
+if "interactive_charts" not in st.session_state:
+    st.session_state["interactive_charts"] = st.query_params.get("charts") == "interactive"
+interactive_charts = st.sidebar.toggle(
+    "Interactive charts", key="interactive_charts",
+    help="Zoom and hover in the browser; large series are downsampled to keep the page light"
+)
+if interactive_charts:
+    st.query_params["charts"] = "interactive"
+elif "charts" in st.query_params:
+    del st.query_params["charts"]
+
+
+def show_chart(trace, tab, key, chart, interactive_chart):
+    """Draw a view's chart: a cached image from the render workers, or a Plotly chart drawn by the browser.
+
+    ``chart`` and ``interactive_chart`` are (builder, args) of figures.py and plotly_figures.py.
+    """
+    if interactive_charts:
+        builder, args = interactive_chart
+        with trace.span(tab, "figure"):
+            fig = builder(*args)
+        with trace.span(tab, "display"):
+            st.plotly_chart(fig, use_container_width=True, config=plotly_figures.CONFIG)
+    else:
+        builder, args = chart
+        with trace.span(tab, "figure"):
+            image = render_service().render(key, builder, *args)
+        with trace.span(tab, "display"):
+            st.image(image, use_column_width=True)
+
+
+# Every view is a fragment: a view's widgets rerun only that view, not the whole script. A fragment rerun
+# doesn't run the module code again, so the module globals keep the values of the last full run; the
+# views get the data snapshot and their trace passed in rather than reading them from globals
+def data_view(view):
+    """Turn ``view(snapshot, trace)`` into a fragment drawn from the data snapshot current when it runs.
+
+    A fragment rerun calls the view again without rerunning the script, so a
+    snapshot read from the module globals would be the one of the last full
+    run, even after the refresher swapped in new data. The view is profiled
+    into a trace of its own, shown in the debug panel below it.
+    """
+    @st.fragment
+    @functools.wraps(view)
+    def run_view():
+        # Opt-in profiling of this view run (DASHBOARD_DEBUG=1 or ?debug=1)
+        profile_history = session_history(st.session_state)
+        trace = RerunTrace(enabled=debug_enabled(st.query_params), run_id=len(profile_history))
+        with trace.span("data", "snapshot"):
+            snapshot = data_refresher().current()
+        view(snapshot, trace)
+
+        # Debug panel with the stage timings of this run, cache counters and trace exports. It is
+        # drawn inside the fragment, so a fragment rerun updates it (a fragment can't use the sidebar)
+        if trace.enabled:
+            trace.finish()
+            show_debug_panel(st, trace, profile_history, figure_cache(), snapshot)
+            profile_history.append(trace.to_dict())
+
+    return run_view
+
 
 # Visualization 1: Delivery Time Analysis
-with tab1:
+# Changing the order status reruns only this view
+@data_view
+def delivery_time_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
     # Add custom filter widgets within Tab 1 for Delivery Time Analysis
     st.header("Distribution of Delivery Time Across Brazil")
     st.subheader("Filter Options")
 
+    with trace.span("tab1", "filter_options"):
+        status_options = cube.order_statuses(data_cube)
+
     order_status = st.multiselect(
         'Select Order Status:',
-        options=all_data['order_status'].unique(),
-        default=all_data['order_status'].unique()
+        options=status_options,
+        key="order_status_tab1"
     )
 
-    # Filter data for Tab 1 based on selected order status
-    filtered_data = all_data[all_data['order_status'].isin(order_status)]
+    # Order counts per delivery time for the selected order status, summed into the fixed histogram bins
+    with trace.span("tab1", "aggregate"):
+        delivery_counts = cube.delivery_counts(data_cube, order_status)
+        delivery_edges = cube.delivery_bin_edges(data_cube)
+        delivery_bins = cube.delivery_histogram(delivery_counts, delivery_edges)
 
     # Check if the filtered data is empty
-    if filtered_data.empty:
+    if delivery_counts.sum() == 0:
         st.warning("No data available for the selected order status. Please adjust your selection.")
     else:
-        # Creating the matplotlib histogram for delivery time
-        fig, ax = plt.subplots(figsize=(12, 6))
-        n, bins, patches = ax.hist(filtered_data['delivery_time_days'].dropna(), bins=15, edgecolor='black',
-                                   color='#6A5ACD', alpha=0.75)
-
-        # Add grid lines along the y-axis for better readability
-        ax.grid(axis='y', linestyle='--', alpha=0.6)
-
-        # Add labels for axes
-        ax.set_xlabel('Delivery Time (Days)', fontsize=14, labelpad=10)
-        ax.set_ylabel('Number of Orders', fontsize=14, labelpad=10)
-
-        # Add a title to the plot
-        ax.set_title('Distribution of Delivery Time Across Brazil', fontsize=16, fontweight='bold', pad=15)
-
-        # Adding annotations for each bar to display the count
-        for i in range(len(patches)):
-            height = n[i]
-            if height > 0:
-                ax.text(
-                    patches[i].get_x() + patches[i].get_width() / 2,
-                    height + max(n) * 0.02,
-                    f'{int(height)}',
-                    ha='center',
-                    va='bottom',
-                    fontsize=10,
-                    color='black'
-                )
-
-        # Highlighting specific bins
-        for patch in patches:
-            if patch.get_height() > 5000:
-                patch.set_facecolor('#FFA07A')
-            else:
-                patch.set_facecolor('#87CEFA')
-
-        # Adding a legend to explain the bar colors
-        legend_elements = [
-            Patch(facecolor='#FFA07A', edgecolor='black', label='High Count (> 5000 Orders)'),
-            Patch(facecolor='#87CEFA', edgecolor='black', label='Moderate Count')
-        ]
-        ax.legend(handles=legend_elements, loc='upper right', fontsize=12, title="Order Count Categories")
-
-        # Adding some visual separation at the borders of the bars
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-
-        plt.figtext(0.5, -0.05, f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
-                    ha="center",
-                    fontsize=9, color='gray')
-
-        st.pyplot(fig)
+        # Draw the histogram once per status selection and data version, reruns reuse the cached image
+        show_chart(
+            trace, "tab1", ("tab1", tuple(order_status), data_version),
+            (figures.delivery_histogram, (delivery_bins, delivery_edges)),
+            (plotly_figures.delivery_histogram, (delivery_bins, delivery_edges, delivery_counts))
+        )
+
+        # Summary statistics of the selection, exact quantiles of the per-day order counts
+        summary = cube.delivery_summary(delivery_counts)
+        mean_col, median_col, iqr_col, p90_col = st.columns(4)
+        mean_col.metric("Average Delivery Time", f"{summary['mean']:.1f} days")
+        median_col.metric("Median Delivery Time", f"{summary['median']:.0f} days")
+        iqr_col.metric("Middle 50% of Orders", f"{summary['q1']:.0f} - {summary['q3']:.0f} days")
+        p90_col.metric("90% Delivered Within", f"{summary['p90']:.0f} days")
 
         st.write(conclusions['tab1'])
 
+
 # Visualization 2: Recency Distribution Analysis
-with tab2:
+@data_view
+def recency_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
     st.header("Recency Distribution Analysis")
-    fig, ax = plt.subplots(figsize=(12, 6))
-    n, bins, patches = ax.hist(rfm_data['recency'], bins=20, edgecolor='black', color='#4682B4', alpha=0.7)
-
-    # Add grid lines for better readability
-    ax.grid(axis='y', linestyle='--', alpha=0.6)
-
-    # Set the labels and title for the plot
-    ax.set_xlabel('Days Since Last Purchase', fontsize=14, labelpad=10)
-    ax.set_ylabel('Number of Customers', fontsize=14, labelpad=10)
-    ax.set_title('Recency Distribution of Customers', fontsize=16, fontweight='bold', pad=15)
-
-    # Add annotations to each bar to display the count
-    for i in range(len(patches)):
-        height = n[i]
-        if height > 0:
-            ax.text(
-                patches[i].get_x() + patches[i].get_width() / 2,
-                height + 50,
-                f'{int(height)}',
-                ha='center',
-                va='bottom',
-                fontsize=10,
-                color='black'
-            )
-
-    plt.figtext(0.5, -0.05, f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
-                ha="center",
-                fontsize=9, color='gray')
-
-    st.pyplot(fig)
+    with trace.span("tab2", "aggregate"):
+        recency_counts = cube.recency_counts(data_cube)
+    show_chart(
+        trace, "tab2", ("tab2", data_version),
+        (figures.recency_histogram, (recency_counts,)),
+        (plotly_figures.recency_histogram, (recency_counts,))
+    )
 
     st.write(conclusions['tab2'])
 
+
 # Visualization 3: Customer Purchase Frequency
-with tab3:
-    # Default values for Q3 2018
-    default_year = 2018
-    default_quarters = [3]
+# Changing the years or quarters reruns only this view
+@data_view
+def purchase_frequency_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
     st.header("Frequency of Purchases by Customers")
 
     # Add custom filter widgets for Year and Quarter
-    available_years = sorted(rfm_data['year'].dropna().unique().astype(int))
+    available_years = cube.cube_years(data_cube)
     available_quarters = [1, 2, 3, 4]
 
     # Allow multi-select for years and quarters
-    selected_years = st.multiselect("Select Year(s)", options=available_years, default=[default_year])
-    selected_quarters = st.multiselect("Select Quarter(s)", options=available_quarters, default=default_quarters)
+    # (defaults to Q3 2018, see VIEW_WIDGET_DEFAULTS)
+    selected_years = st.multiselect("Select Year(s)", options=available_years, key="year_selection_tab3")
+    selected_quarters = st.multiselect("Select Quarter(s)", options=available_quarters, key="quarter_selection_tab3")
 
-    # Filter the data based on the selected year(s) and quarter(s)
+    # Merge the order counts of every customer across the selected year(s) and quarter(s)
     if selected_years and selected_quarters:
-        filtered_data = rfm_data[
-            (rfm_data['year'].isin(selected_years)) & (rfm_data['quarter'].isin(selected_quarters))]
+        with trace.span("tab3", "aggregate"):
+            frequency_counts = cube.frequency_counts(data_cube, selected_years, selected_quarters)
     else:
-        filtered_data = pd.DataFrame()  # Empty dataframe if no year or quarter is selected
+        frequency_counts = pd.Series(dtype='int64')  # No counts if no year or quarter is selected
 
     # Set dynamic header based on user selection
     if selected_years and selected_quarters:
@@ -235,319 +296,199 @@ with tab3:
 
     st.header(dynamic_header)
 
-    # If there are no quarters selected or filtered_data is empty, display a message
-    if filtered_data.empty:
+    # If there are no quarters selected or there are no customers, display a message
+    if frequency_counts.sum() == 0:
         st.warning("No data available for the selected year and quarter(s). Please adjust your selection.")
     else:
-        # Set up the figure size and plot histogram for Streamlit
-        fig, ax = plt.subplots(figsize=(12, 6))
-        n, bins, patches = ax.hist(
-            filtered_data['frequency'],
-            bins=15,
-            edgecolor='black',
-            log=True,
-            color='lightcoral',
-            alpha=0.75
+        # Draw the histogram once per year/quarter selection and data version
+        show_chart(
+            trace, "tab3", ("tab3", tuple(selected_years), tuple(selected_quarters), data_version),
+            (figures.frequency_histogram, (frequency_counts, years_str, quarters_str)),
+            (plotly_figures.frequency_histogram, (frequency_counts, years_str, quarters_str))
         )
 
-        # Set labels and title with increased font size and bold styling
-        ax.set_xlabel('Number of Purchases (Frequency)', fontsize=14)
-        ax.set_ylabel('Number of Customers (Log Scale)', fontsize=14)
-        ax.set_title(
-            f'Frequency of Purchases by Customers in Year(s): {years_str}, Quarter(s): {quarters_str} (Log Scale)',
-            fontsize=16, weight='bold')
-
-        # Adding grid lines for better readability
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
-
-        # Adding text annotations for each bar
-        for i in range(len(patches)):
-            height = n[i]
-            if height > 0:
-                ax.text(
-                    patches[i].get_x() + patches[i].get_width() / 2,
-                    height,
-                    f'{int(height)}',
-                    ha='center',
-                    va='bottom',
-                    fontsize=10,
-                    color='black',  # Use a contrasting color to make text annotations visible
-                    fontweight='bold'
-                )
-
-        # Set limits and style for the y-axis
-        ax.set_ylim(bottom=0.5)
-        ax.set_yscale('log')
-        ax.set_yticks([1, 10, 100, 1000, 10000])
-        ax.set_yticklabels(['1', '10', '100', '1K', '10K'])  # Customize tick labels
-
-        # Add some decorative elements
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-
-        # Adding a legend to clarify that the bars represent frequency counts
-        ax.legend(['Customer Frequency'], loc='upper right', fontsize=12, title='Legend')
-
-        plt.figtext(0.5, -0.05, f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
-                    ha="center",
-                    fontsize=9, color='gray')
-
-        st.pyplot(fig)
-
         st.write(conclusions['tab3'])
 
+
 # Visualization 4: Average Expenditure Per Customer with Year Filter
-with tab4:
+# Changing the years reruns only this view
+@data_view
+def expenditure_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
     # Add custom filter widgets for Year within Tab 4
     st.header("Customer Expenditure Analysis")
     st.subheader("Filter Options")
 
     # Multiselect widget for selecting the year, default set to 2018
-    available_years = sorted(rfm_data['year'].dropna().unique().astype(int))
+    available_years = cube.cube_years(data_cube)
     selected_years = st.multiselect(
         "Select Year(s) for Analysis:",
         options=available_years,
-        default=[2018]
+        key="year_selection_tab4"
     )
 
-    # Filter the data based on selected years from rfm_data
-    filtered_data = rfm_data[rfm_data['year'].isin(selected_years)]
+    # Merge the expenditure quantile sketches of the selected years
+    with trace.span("tab4", "aggregate"):
+        monetary_sketch = cube.monetary_sketch(data_cube, selected_years)
 
-    # If no years are selected or filtered_data is empty, display a warning
-    if filtered_data.empty:
+    # If no years are selected or there are no customers, display a warning
+    if monetary_sketch.sum() == 0:
         st.warning("No data available for the selected year(s). Please adjust your selection.")
     else:
         # Set the title based on selected years
         selected_years_str = ', '.join(map(str, selected_years))
-        plot_title = f"Boxplot of Customer Expenditure in {selected_years_str}"
-
-        # Create the boxplot for the filtered data
-        fig, ax = plt.subplots(figsize=(12, 6))
-
-        # Draw the boxplot with enhancements
-        box = ax.boxplot(
-            filtered_data['monetary'],
-            vert=False,
-            patch_artist=True,
-            boxprops=dict(facecolor='lightblue', color='navy', linewidth=1.5),
-            medianprops=dict(color='red', linewidth=2),
-            whiskerprops=dict(color='navy', linestyle='--', linewidth=1.5),
-            capprops=dict(color='navy', linewidth=1.5),
-            flierprops=dict(marker='o', color='orange', alpha=0.5, markersize=6)
-        )
 
-        # Set the labels and title
-        ax.set_xlabel('Total Expenditure (BRL)', fontsize=14)
-        ax.set_title(plot_title, fontsize=16, weight='bold')
-        ax.set_yticks([])  # Remove y-axis ticks since we have a single boxplot
-
-        # Adding grid for better readability
-        ax.grid(axis='x', linestyle='--', alpha=0.7)
-
-        # Highlight the median value with annotation
-        median = filtered_data['monetary'].median()
-        ax.annotate(
-            f'Median: {median:.2f}',
-            xy=(median, 1),
-            xytext=(median + 200, 1.1),
-            arrowprops=dict(facecolor='black', arrowstyle='->', lw=1.5),
-            fontsize=12, color='darkred'
+        # Draw the boxplot from the sketch quartiles, whiskers and a capped sample of outliers
+        # once per year selection and data version
+        box_stats = sketch_boxplot_stats(monetary_sketch)
+        show_chart(
+            trace, "tab4", ("tab4", tuple(selected_years), data_version),
+            (figures.expenditure_boxplot, (box_stats, selected_years_str, SKETCH_ALPHA)),
+            (plotly_figures.expenditure_boxplot, (box_stats, selected_years_str, SKETCH_ALPHA))
         )
 
-        # Add some decorations to make it more polished
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-
-        plt.figtext(0.5, -0.05, f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
-                    ha="center",
-                    fontsize=9, color='gray')
-
-        st.pyplot(fig)
-
         st.write(conclusions['tab4'])
 
+
 # Visualization 5: Regions with the Highest Number of Purchases
-with tab5:
+# A map click or a drill-down state reruns only this view
+@data_view
+def geographic_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
     st.header("Regions with the Highest Number of Purchases")
 
     # Aggregate number of purchases by state using all_data
-    state_purchases = all_data.groupby('customer_state')['order_id'].count().reset_index()
-    state_purchases.columns = ['state', 'total_purchases']
-    state_purchases = state_purchases.sort_values(by='total_purchases', ascending=False)
+    with trace.span("tab5", "aggregate"):
+        state_purchases = cube.state_purchases(data_cube)
 
-    # Load GeoJSON file for Brazil states boundaries
-    geojson_file_path = Path(__file__).parent.parent / 'map' / 'brazil-states.geojson'
+    # Build the map from the cached, simplified state boundaries
     try:
-        with open(geojson_file_path, 'r') as f:
-            brazil_geo = json.load(f)
+        with trace.span("tab5", "map_html"):
+            map_html = load_purchase_map(state_purchases, data_version)
+            state_names = {sigla: state['properties']['name'] for sigla, state in load_states(MAP_TOLERANCE).items()}
     except FileNotFoundError:
-        st.error(f"GeoJSON file not found at {geojson_file_path}. Please check the path.")
+        st.error(f"GeoJSON file not found at {GEOJSON_PATH}. Please check the path.")
         st.stop()
 
-    # Merge GeoJSON data with state purchase data to include the total_purchases field
-    for feature in brazil_geo['features']:
-        state_code = feature['properties']['sigla']
-        purchase_info = state_purchases[state_purchases['state'] == state_code]
-        if not purchase_info.empty:
-            feature['properties']['total_purchases'] = int(purchase_info['total_purchases'].values[0])
-        else:
-            feature['properties']['total_purchases'] = 0
-
-    # Create a base map centered around Brazil
-    brazil_map = folium.Map(location=[-14.2350, -51.9253], zoom_start=4, tiles='cartodbpositron')
-
-    # Add the Choropleth layer for visualizing the number of purchases by state
-    folium.Choropleth(
-        geo_data=brazil_geo,
-        name='choropleth',
-        data=state_purchases,
-        columns=['state', 'total_purchases'],
-        key_on='feature.properties.sigla',
-        fill_color='YlGnBu',
-        fill_opacity=0.7,
-        line_opacity=0.5,
-        line_color='black',
-        legend_name='Number of Purchases by State',
-        highlight=True
-    ).add_to(brazil_map)
-
-    # Add custom tooltips for additional information about each state
-    style_function = lambda x: {
-        'fillColor': '#ffffff',
-        'color': '#000000',
-        'fillOpacity': 0.1,
-        'weight': 0.1
-    }
-    highlight_function = lambda x: {
-        'fillColor': '#0000ff',
-        'color': '#000000',
-        'fillOpacity': 0.5,
-        'weight': 0.4
-    }
-
-    # Add GeoJson layer with tooltips showing state name, state code, and total purchases
-    folium.GeoJson(
-        brazil_geo,
-        style_function=style_function,
-        control=False,
-        highlight_function=highlight_function,
-        tooltip=folium.GeoJsonTooltip(
-            fields=['sigla', 'name', 'total_purchases'],  # Use fields from the GeoJSON properties
-            aliases=['State Code:', 'State Name:', 'Total Purchases:'],
-            localize=True
-        )
-    ).add_to(brazil_map)
-
-    # Add a layer control panel to the map
-    folium.LayerControl(collapsed=False).add_to(brazil_map)
+    # Display the map in Streamlit; it reports the last state clicked
+    with trace.span("tab5", "display"):
+        clicked = purchase_map(html=map_html, height=510, width=700, key="purchase_map", default=None)
+
+    # A new click on the map selects that state for the drill-down, the select box can change it afterwards
+    if clicked and clicked != st.session_state.get("drilldown_clicked"):
+        st.session_state["drilldown_clicked"] = clicked
+        st.session_state["drilldown_state"] = clicked["state"]
+
+    # States with the most purchases first
+    selected_state = st.selectbox(
+        "Drill down into a state:",
+        options=state_purchases.sort_values("total_purchases", ascending=False)["state"].tolist(),
+        format_func=lambda sigla: f"{sigla} - {state_names.get(sigla, sigla)}",
+        placeholder="Click a state on the map",
+        key="drilldown_state"
+    )
 
-    # Display the map in Streamlit
-    folium_static(brazil_map)
+    if selected_state is not None and not snapshot.drilldown:
+        st.info("The state drill-down needs item prices and the seller and product reference tables, "
+                "rebuild all_data with `python pipeline.py` to enable it.")
+    elif selected_state is not None:
+        # The breakdowns are precomputed per state in the snapshot, selecting a state is a lookup
+        with trace.span("tab5", "drilldown"):
+            breakdowns = cube.state_drilldown(snapshot.drilldown, selected_state)
+            cities = breakdowns["state_cities"]
+
+        st.subheader(f"{state_names.get(selected_state, selected_state)} ({selected_state})")
+        orders_column, revenue_column, cities_column, sellers_column = st.columns(4)
+        orders_column.metric("Purchases", f"{int(cities['orders'].sum()):,}")
+        revenue_column.metric("Revenue (BRL)", f"{cities['revenue'].sum():,.2f}")
+        cities_column.metric("Customer Cities", f"{len(cities):,}")
+        sellers_column.metric("Sellers", f"{len(breakdowns['state_sellers']):,}")
+
+        # Top rows of every breakdown; items without a product category are listed as unknown
+        tables = {
+            "Top Cities": "state_cities",
+            "Top Sellers": "state_sellers",
+            "Top Categories": "state_categories",
+            "Top Zip Prefixes": "state_zip_prefixes",
+        }
+        for table_tab, table in zip(st.tabs(list(tables)), tables.values()):
+            rows = breakdowns[table].head(DRILLDOWN_ROWS)
+            if table == "state_categories":
+                # The category column is categorical, "unknown" is not one of its categories
+                rows = rows.astype({"product_category_name_english": object}).fillna(
+                    {"product_category_name_english": "unknown"})
+            table_tab.dataframe(rows, hide_index=True, use_container_width=True,
+                                column_config={"revenue": st.column_config.NumberColumn(format="%.2f")})
 
     st.write(conclusions['tab5'])
 
+
 # Visualization 6: Customer Segmentation Based on Purchase Frequency
-with tab6:
+# Changing the years reruns only this view
+@data_view
+def segmentation_view(snapshot, trace):
+    data_cube, data_version = snapshot.cube, snapshot.version
 
     # Add header and filter for the year (from 2016 to 2018) with default set to 2018
     st.header("Customer Segmentation Based on Purchase Frequency in Selected Year(s)")
     st.subheader("Filter Options")
 
-    # Convert 'order_purchase_timestamp' to datetime if it's not already
-    if not pd.api.types.is_datetime64_any_dtype(all_data['order_purchase_timestamp']):
-        all_data['order_purchase_timestamp'] = pd.to_datetime(all_data['order_purchase_timestamp'])
-
     # Add a multiselect widget for selecting the year(s), default set to 2018
-    available_years = sorted(all_data['order_purchase_timestamp'].dt.year.unique())
+    # (all_data is partitioned on the year of 'order_purchase_timestamp')
+    available_years = cube.cube_years(data_cube)
     selected_years = st.multiselect(
         "Select Year(s) for Analysis:",
         options=available_years,
-        default=[2018],
         key="year_selection_tab6"
     )
 
-    # Filter the data based on selected years
-    filtered_data = all_data[all_data['order_purchase_timestamp'].dt.year.isin(selected_years)]
+    # Merge the per-year order counts of every customer in the customer frequency index (shared with tab3)
+    if selected_years:
+        with trace.span("tab6", "aggregate"):
+            frequency_counts = cube.frequency_counts(data_cube, selected_years)
+    else:
+        frequency_counts = pd.Series(dtype='int64')
 
     # If no years are selected, display a warning
-    if filtered_data.empty:
+    if frequency_counts.sum() == 0:
         st.warning("No data available for the selected year(s). Please adjust your selection.")
     else:
-        frequency_data = filtered_data.groupby('customer_unique_id').size().reset_index(name='frequency')
-        low_segment = frequency_data[frequency_data['frequency'] == 1]
-        medium_segment = frequency_data[(frequency_data['frequency'] >= 2) & (frequency_data['frequency'] <= 3)]
-        high_segment = frequency_data[(frequency_data['frequency'] >= 4) & (frequency_data['frequency'] <= 10)]
-        very_high_segment = frequency_data[frequency_data['frequency'] > 10]
-
         # Count the number of customers in each segment
-        segment_counts = [
-            len(low_segment),
-            len(medium_segment),
-            len(high_segment),
-            len(very_high_segment)
-        ]
-
-        # Define labels and colors for the segments
-        segment_labels = ['Low Frequency (1 Purchase)',
-                          'Medium Frequency (2-3 Purchases)',
-                          'High Frequency (4-10 Purchases)',
-                          'Very High Frequency (> 10 Purchases)']
-        segment_label_x = ['Low',
-                          'Medium',
-                          'High',
-                          'Very High']
-        segment_colors = ['skyblue', 'orange', 'green', 'red']
-
-        # Create the bar chart with labels on the x-axis
-        fig, ax = plt.subplots(figsize=(12, 6))
-        bars = ax.bar(segment_label_x, segment_counts, color=segment_colors, edgecolor='black')
-
-        # Adding text annotations for each bar, positioned more precisely
-        for i, bar in enumerate(bars):
-            ax.text(
-                bar.get_x() + bar.get_width() / 2,
-                bar.get_height() + (bar.get_height() * 0.02),
-                f'{int(bar.get_height())} Customers',
-                ha='center',
-                va='bottom',
-                fontsize=10,
-                fontweight='bold',
-                color='black'
-            )
+        segment_counts = cube.segment_counts(frequency_counts)
 
         # Set the title based on selected years
         selected_years_str = ', '.join(map(str, selected_years))
-        plot_title = f"Customer Segmentation Based on Purchase Frequency in Year(s): {selected_years_str}"
-
-        # Adding labels and title
-        ax.set_xlabel('Customer Segment', fontsize=14)
-        ax.set_ylabel('Number of Customers', fontsize=14)
-        ax.set_title(plot_title, fontsize=16, weight='bold')
-
-        # Set x-axis labels at a 45-degree angle for better readability
-        plt.xticks(rotation=45, ha='right')
-
-        # Adding the legend
-        legend = ax.legend(
-            handles=bars,
-            labels=segment_labels,
-            loc='upper right',
-            shadow=True,
-            fontsize='medium',
-            title="Purchase Frequency Segments"
+
+        # Draw the bar chart once per year selection and data version
+        show_chart(
+            trace, "tab6", ("tab6", tuple(selected_years), data_version),
+            (figures.segmentation_chart, (segment_counts, selected_years_str)),
+            (plotly_figures.segmentation_chart, (segment_counts, selected_years_str))
         )
 
-        # Remove top and right spines for better aesthetics
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
+        # Display the conclusion text (make sure to define 'conclusions' dict beforehand)
+        st.write(conclusions['tab6'])
+
 
-        # Adding gridlines for better readability
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
+# Views by id; only the selected one is computed and drawn on a rerun
+VIEWS = {
+    "tab1": delivery_time_view,
+    "tab2": recency_view,
+    "tab3": purchase_frequency_view,
+    "tab4": expenditure_view,
+    "tab5": geographic_view,
+    "tab6": segmentation_view,
+}
 
-        st.pyplot(fig)
+# Start on the view named in the URL (?view=tab5), so a view can be linked to directly
+if "view" not in st.session_state:
+    requested_view = st.query_params.get("view", "tab1")
+    st.session_state["view"] = requested_view if requested_view in VIEWS else "tab1"
 
-        # Display the conclusion text (make sure to define 'conclusions' dict beforehand)
-        st.write(conclusions['tab6'])
+selected_view = st.radio("Select View:", options=list(VIEWS), format_func=VIEW_LABELS.get, horizontal=True,
+                         key="view", label_visibility="collapsed")
+st.query_params["view"] = selected_view
+VIEWS[selected_view]()
 
 current_year = datetime.datetime.now().year
 footer = f"""
@@ -0,0 +1,429 @@
+"""Columnar Parquet store for the dashboard datasets.
+
+The dashboard used to re-parse ``all_data.csv`` and ``rfm_data.csv`` on every
+cold start. This module converts those files (and the raw ``data/olist_*.csv``
+tables) into typed, compressed Parquet datasets partitioned by
+``year``/``quarter`` so the loaders can read only the columns and partitions a
+tab actually needs.
+
+Build the store with::
+
+    python dashboard/data_store.py
+
+When the store has not been built yet, ``read_dataset`` falls back to the CSV
+files so the dashboard keeps working unchanged.
+"""
+import argparse
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Define the data paths relative to this module
+base_path = Path(__file__).parent
+STORE_PATH = base_path / "store"
+RAW_DATA_PATH = base_path.parent / "data"
+
+# Rows read from a CSV at a time while ingesting, keeps memory bounded for large exports
+CHUNK_SIZE = 500_000
+
+# Hive-style partitioning shared by every partitioned dataset
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int16()), ("quarter", pa.int8())]),
+    flavor="hive"
+)
+
+OLIST_DATETIMES = [
+    "order_purchase_timestamp",
+    "order_approved_at",
+    "order_delivered_carrier_date",
+    "order_delivered_customer_date",
+    "order_estimated_delivery_date",
+    "shipping_limit_date",
+    "review_creation_date",
+    "review_answer_timestamp",
+]
+
+# Declared types per dataset. "partition_on" is the timestamp the year/quarter
+# partitions are derived from; datasets that already carry year/quarter columns
+# (rfm_data) are partitioned on those directly.
+SCHEMAS = {
+    "all_data": {
+        "categories": ["order_status", "customer_state", "customer_city", "seller_state",
+                       "product_category_name", "product_category_name_english"],
+        "datetimes": OLIST_DATETIMES,
+        "partition_on": "order_purchase_timestamp",
+    },
+    "rfm_data": {
+        "categories": [],
+        "datetimes": ["last_purchase"],
+        "partition_on": None,
+    },
+    "olist_orders_dataset": {
+        "categories": ["order_status"],
+        "datetimes": OLIST_DATETIMES,
+        "partition_on": "order_purchase_timestamp",
+    },
+    "olist_order_items_dataset": {"categories": [], "datetimes": OLIST_DATETIMES},
+    "olist_order_payments_dataset": {"categories": ["payment_type"], "datetimes": []},
+    "olist_order_reviews_dataset": {"categories": [], "datetimes": OLIST_DATETIMES},
+    "olist_customers_dataset": {"categories": ["customer_state", "customer_city"], "datetimes": []},
+    "olist_sellers_dataset": {"categories": ["seller_state", "seller_city"], "datetimes": []},
+    "olist_products_dataset": {"categories": ["product_category_name"], "datetimes": []},
+    "olist_geolocation_dataset": {"categories": ["geolocation_state"], "datetimes": []},
+    "product_category_name_translation": {"categories": [], "datetimes": []},
+}
+
+# Zip code prefixes are identifiers, keep their leading zeros
+STRING_COLUMNS = ["customer_zip_code_prefix", "seller_zip_code_prefix", "geolocation_zip_code_prefix"]
+
+# Identifiers are nearly unique per row, so instead of categories they are held as Arrow-backed
+# strings: one contiguous buffer per column instead of a Python object per value
+ID_COLUMNS = ["order_id", "customer_id", "customer_unique_id", "product_id", "seller_id", "review_id"]
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+# Narrower numeric types; money stays float64 because the RFM spend is summed from it
+NUMERIC_DTYPES = {
+    "delivery_time_days": "float32",
+    "order_item_id": "int16",
+    "payment_sequential": "int16",
+    "payment_installments": "int16",
+    "review_score": "int8",
+    "frequency": "int32",
+    "recency": "int32",
+    "product_name_lenght": "float32",
+    "product_description_lenght": "float32",
+    "product_photos_qty": "float32",
+    "product_weight_g": "float32",
+    "product_length_cm": "float32",
+    "product_height_cm": "float32",
+    "product_width_cm": "float32",
+}
+
+
+def _schema(name):
+    return SCHEMAS.get(name, {"categories": [], "datetimes": []})
+
+
+def is_partitioned(name):
+    return name in SCHEMAS and "partition_on" in SCHEMAS[name]
+
+
+def csv_path(name):
+    # Dashboard datasets live next to dashboard.py, raw Olist tables under data/
+    if name in ("all_data", "rfm_data"):
+        return base_path / f"{name}.csv"
+    return RAW_DATA_PATH / f"{name}.csv"
+
+
+def dataset_path(name, store_path=None):
+    return Path(store_path or STORE_PATH) / name
+
+
+def apply_schema(frame, name):
+    """Cast the columns of ``frame`` to the types declared for ``name``."""
+    schema = _schema(name)
+    for column in schema["datetimes"]:
+        if column in frame.columns and not pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = pd.to_datetime(frame[column], errors="coerce")
+    for column in schema["categories"]:
+        if column in frame.columns and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype("category")
+    for column in ID_COLUMNS + STRING_COLUMNS:
+        if column in frame.columns and frame[column].dtype != STRING_DTYPE:
+            frame[column] = frame[column].astype(STRING_DTYPE)
+    for column, dtype in NUMERIC_DTYPES.items():
+        if column in frame.columns and frame[column].dtype != dtype:
+            # Integer columns with missing values keep their type rather than lose the NaNs
+            if pd.api.types.is_float_dtype(dtype) or not frame[column].isna().any():
+                frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def to_pandas(table, name):
+    """Convert an Arrow table read from the store to a DataFrame with the declared types."""
+    # Strings map straight onto Arrow-backed columns, without creating a Python object per value
+    frame = table.to_pandas(types_mapper={pa.string(): STRING_DTYPE, pa.large_string(): STRING_DTYPE}.get)
+    return apply_schema(frame, name)
+
+
+def memory_report(frame):
+    """Memory of each column of ``frame`` next to its size as untyped object/64-bit columns, in bytes."""
+    rows = []
+    for column in frame.columns:
+        series = frame[column]
+        typed = series.memory_usage(index=False, deep=True)
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+            untyped = 8 * len(series)
+        else:
+            untyped = series.astype(object).memory_usage(index=False, deep=True)
+        rows.append({"column": column, "dtype": str(series.dtype), "bytes": typed, "untyped_bytes": untyped})
+    report = pd.DataFrame(rows, columns=["column", "dtype", "bytes", "untyped_bytes"])
+    total = {"column": "total", "dtype": "", "bytes": report["bytes"].sum(),
+             "untyped_bytes": report["untyped_bytes"].sum()}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report["bytes_per_row"] = (report["bytes"] / max(len(frame), 1)).round(1)
+    report["saved"] = (1 - report["bytes"] / report["untyped_bytes"].where(report["untyped_bytes"] > 0)).round(3)
+    return report
+
+
+def add_partition_columns(frame, name):
+    """Add the ``year``/``quarter`` partition keys derived from the dataset's timestamp."""
+    partition_on = _schema(name).get("partition_on")
+    if partition_on is not None:
+        timestamps = frame[partition_on]
+        frame["year"] = timestamps.dt.year.astype("Int16")
+        frame["quarter"] = timestamps.dt.quarter.astype("Int8")
+    else:
+        frame["year"] = frame["year"].astype("Int16")
+        frame["quarter"] = frame["quarter"].astype("Int8")
+    return frame
+
+
+def read_csv(path, name, columns=None, chunksize=None):
+    """Read a CSV file with the types declared for ``name``, optionally in chunks."""
+    header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    schema = _schema(name)
+    usecols = [column for column in header if columns is None or column in columns]
+    dtype = {column: "category" for column in schema["categories"] if column in usecols}
+    dtype.update({column: STRING_DTYPE for column in ID_COLUMNS + STRING_COLUMNS if column in usecols})
+    parse_dates = [column for column in schema["datetimes"] if column in usecols]
+    return pd.read_csv(path, usecols=usecols, dtype=dtype, parse_dates=parse_dates,
+                       encoding="utf-8-sig", chunksize=chunksize)
+
+
+def _write_table(frame, name, root, basename, compression, existing_data_behavior="overwrite_or_ignore"):
+    frame = apply_schema(frame, name)
+    if is_partitioned(name):
+        frame = add_partition_columns(frame, name)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        ds.write_dataset(
+            table, root, format="parquet", partitioning=PARTITIONING,
+            basename_template=f"{basename}-{{i}}.parquet",
+            existing_data_behavior=existing_data_behavior,
+            file_options=ds.ParquetFileFormat().make_write_options(compression=compression)
+        )
+    else:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_table(table, root / f"{basename}.parquet", compression=compression)
+
+
+def write_dataset(frames, name, store_path=None, compression="zstd", append=False):
+    """Write an iterable of DataFrame chunks as a Parquet dataset.
+
+    Replaces any previous dataset unless ``append`` is set, in which case the
+    chunks are added as new files next to the existing ones.
+    """
+    root = dataset_path(name, store_path)
+    if root.exists() and not append:
+        shutil.rmtree(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    # A token per write keeps file names of appended batches from colliding
+    token = uuid.uuid4().hex[:8]
+    rows = 0
+    for i, frame in enumerate(frames):
+        _write_table(frame, name, root, f"part-{token}-{i}", compression)
+        rows += len(frame)
+    return rows
+
+
+def write_partitions(frame, name, store_path=None, compression="zstd"):
+    """Replace the year/quarter partitions present in ``frame``, leaving every other partition untouched."""
+    root = dataset_path(name, store_path)
+    root.mkdir(parents=True, exist_ok=True)
+    _write_table(frame, name, root, f"part-{uuid.uuid4().hex[:8]}", compression,
+                 existing_data_behavior="delete_matching")
+    return len(frame)
+
+
+def ingest_csv(name, path=None, store_path=None, compression="zstd", chunksize=CHUNK_SIZE, append=False):
+    """Convert one CSV file into a typed Parquet dataset, streaming it in chunks."""
+    path = Path(path or csv_path(name))
+    chunks = read_csv(path, name, chunksize=chunksize)
+    return write_dataset(chunks, name, store_path=store_path, compression=compression, append=append)
+
+
+def has_dataset(name, store_path=None):
+    return dataset_path(name, store_path).is_dir()
+
+
+def dataset_exists(name, store_path=None):
+    """Whether a dataset can be read, from the store or from its CSV file."""
+    return has_dataset(name, store_path) or csv_path(name).exists()
+
+
+def dataset_columns(name, store_path=None):
+    """The column names of a dataset, from the store's schema or the CSV header, without reading any rows."""
+    if has_dataset(name, store_path):
+        return list(open_dataset(name, store_path).schema.names)
+    return list(pd.read_csv(csv_path(name), nrows=0, encoding="utf-8-sig").columns)
+
+
+def filter_expression(years=None, quarters=None, where=None):
+    filters = []
+    if years is not None:
+        filters.append(ds.field("year").isin([int(year) for year in years]))
+    if quarters is not None:
+        filters.append(ds.field("quarter").isin([int(quarter) for quarter in quarters]))
+    for column, values in (where or {}).items():
+        filters.append(ds.field(column).isin(list(values)))
+
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_dataset(name, store_path=None):
+    partitioning = PARTITIONING if is_partitioned(name) else None
+    return ds.dataset(dataset_path(name, store_path), format="parquet", partitioning=partitioning)
+
+
+def read_dataset(name, columns=None, years=None, quarters=None, where=None, store_path=None):
+    """Read ``columns`` of a dataset, restricted to the given year/quarter partitions.
+
+    ``where`` maps column names to the values to keep, e.g. the order ids of a
+    batch, and is pushed down to the Parquet scan. Reads from the Parquet store
+    when it exists and falls back to the CSV file otherwise. ``year``/``quarter``
+    are only returned when asked for.
+    """
+    columns = list(columns) if columns is not None else None
+
+    if has_dataset(name, store_path):
+        dataset = open_dataset(name, store_path)
+        table = dataset.to_table(columns=columns, filter=filter_expression(years, quarters, where))
+        return to_pandas(table, name)
+
+    # No store yet: read the CSV, still only the requested columns
+    partition_on = _schema(name).get("partition_on")
+    needs_partitions = years is not None or quarters is not None
+    read_columns = columns
+    if columns is not None:
+        read_columns = columns + list(where or {})
+        if needs_partitions:
+            read_columns += [partition_on or "year", "quarter"]
+    frame = apply_schema(read_csv(csv_path(name), name, columns=read_columns), name)
+    if where:
+        mask = pd.Series(True, index=frame.index)
+        for column, values in where.items():
+            mask &= frame[column].isin(values)
+        frame = frame[mask].reset_index(drop=True)
+    if needs_partitions:
+        frame = add_partition_columns(frame, name)
+        mask = pd.Series(True, index=frame.index)
+        if years is not None:
+            mask &= frame["year"].isin(years)
+        if quarters is not None:
+            mask &= frame["quarter"].isin(quarters)
+        frame = frame[mask].reset_index(drop=True)
+    if columns is not None:
+        frame = frame[columns]
+    return frame
+
+
+def read_products(store_path=None):
+    """The products reference table with each product's category and, when translated, its English name."""
+    products = read_dataset("olist_products_dataset", columns=["product_id", "product_category_name"],
+                            store_path=store_path)
+    if dataset_exists("product_category_name_translation", store_path):
+        translation = read_dataset("product_category_name_translation", store_path=store_path)
+        products = products.merge(translation, on="product_category_name", how="left")
+    return products
+
+
+def iter_dataset(name, columns=None, store_path=None, chunksize=CHUNK_SIZE):
+    """Yield a dataset as a sequence of DataFrames without materializing all of it.
+
+    Partitioned datasets in the store are read one year/quarter partition at a
+    time, anything else in batches of ``chunksize`` rows.
+    """
+    columns = list(columns) if columns is not None else None
+
+    if has_dataset(name, store_path) and is_partitioned(name):
+        for year, quarter in dataset_partitions(name, store_path).itertuples(index=False):
+            yield read_dataset(name, columns=columns, years=[year], quarters=[quarter], store_path=store_path)
+    elif has_dataset(name, store_path):
+        scanner = open_dataset(name, store_path).scanner(columns=columns, batch_size=chunksize)
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield to_pandas(pa.Table.from_batches([batch]), name)
+    else:
+        for chunk in read_csv(csv_path(name), name, columns=columns, chunksize=chunksize):
+            yield apply_schema(chunk, name)
+
+
+def data_version(names=("all_data", "rfm_data", "cube"), store_path=None):
+    """Identify the current contents of the given datasets by their latest modification time."""
+    mtimes = [0]
+    for name in names:
+        root = dataset_path(name, store_path)
+        if root.is_dir():
+            mtimes += [path.stat().st_mtime_ns for path in root.rglob("*") if path.is_file()]
+        elif csv_path(name).exists():
+            mtimes.append(csv_path(name).stat().st_mtime_ns)
+    return max(mtimes)
+
+
+def dataset_partitions(name, store_path=None):
+    """Return the distinct (year, quarter) pairs present in a partitioned dataset."""
+    root = dataset_path(name, store_path)
+    if root.is_dir():
+        pairs = []
+        for quarter_dir in root.glob("year=*/quarter=*"):
+            year = quarter_dir.parent.name.split("=", 1)[1]
+            quarter = quarter_dir.name.split("=", 1)[1]
+            if year.isdigit() and quarter.isdigit():
+                pairs.append((int(year), int(quarter)))
+        return pd.DataFrame(sorted(pairs), columns=["year", "quarter"])
+
+    partition_on = _schema(name)["partition_on"]
+    frame = read_csv(csv_path(name), name, columns=[partition_on or "year", "quarter"])
+    frame = add_partition_columns(apply_schema(frame, name), name)
+    pairs = frame[["year", "quarter"]].dropna().drop_duplicates().astype(int)
+    return pairs.sort_values(["year", "quarter"]).reset_index(drop=True)
+
+
+def ingest_raw(source_path=None, store_path=None, compression="zstd"):
+    """Ingest every raw Olist table found in ``source_path``."""
+    raw_path = Path(source_path or RAW_DATA_PATH)
+    return {path.stem: ingest_csv(path.stem, path, store_path=store_path, compression=compression)
+            for path in sorted(raw_path.glob("*.csv"))}
+
+
+def ingest_all(source_path=None, store_path=None, compression="zstd"):
+    """Ingest the dashboard CSVs and every raw Olist table that is present."""
+    ingested = {}
+    for name in ("all_data", "rfm_data"):
+        if csv_path(name).exists():
+            ingested[name] = ingest_csv(name, store_path=store_path, compression=compression)
+    ingested.update(ingest_raw(source_path, store_path, compression))
+    return ingested
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the dashboard CSV files into a Parquet store.")
+    parser.add_argument("--source", type=Path, default=RAW_DATA_PATH, help="Directory with the raw olist_*.csv tables")
+    parser.add_argument("--store", type=Path, default=STORE_PATH, help="Output directory for the Parquet store")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    parser.add_argument("--memory-report", nargs="+", metavar="DATASET",
+                        help="Print the in-memory size of each column of these datasets instead of ingesting")
+    args = parser.parse_args()
+
+    if args.memory_report:
+        for name in args.memory_report:
+            print(f"{name}:")
+            print(memory_report(read_dataset(name, store_path=args.store)).to_string(index=False))
+        return
+
+    ingested = ingest_all(args.source, args.store, args.compression)
+    for name, rows in ingested.items():
+        print(f"{name}: {rows} rows -> {dataset_path(name, args.store)}")
+
+
+if __name__ == "__main__":
+    main()
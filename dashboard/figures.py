@@ -0,0 +1,500 @@
+"""Matplotlib figures of the dashboard tabs and a server-side cache of their rendered images.
+
+Each chart is built from the small pre-aggregated inputs of its tab (value
+counts, box plot statistics, segment counts) on a standalone
+``matplotlib.figure.Figure``. Those figures never enter pyplot's global figure
+registry, so nothing accumulates across Streamlit reruns, and every figure is
+closed as soon as it has been rendered to PNG/SVG bytes.
+
+``FigureCache`` keeps the rendered bytes keyed by (tab, filter selection, data
+version) and evicts the least recently used images once a size bound is
+reached, so a chart is drawn once per distinct selection instead of on every
+rerun.
+
+``RenderService`` draws the figures in a pool of worker processes: the
+builders only take small pre-aggregated inputs, so they are cheap to send to a
+worker, and every worker has its own interpreter and matplotlib state. Charts
+requested by several sessions (or several at once by one caller) render in
+parallel across cores, and concurrent requests for the same chart share one
+render. Set ``DASHBOARD_RENDER_WORKERS=0`` to render in-process instead.
+"""
+import datetime
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+
+# Same output options st.pyplot uses, so cached images look exactly like before
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+
+
+def add_footer(fig):
+    fig.text(0.5, -0.05, f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
+             ha="center",
+             fontsize=9, color='gray')
+
+
+def delivery_histogram(bin_counts, bin_edges):
+    """Tab 1: histogram of delivery time from order counts per fixed bin of delivery days."""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    n, bins, patches = ax.hist(bin_edges[:-1], weights=bin_counts, bins=bin_edges,
+                               edgecolor='black', color='#6A5ACD', alpha=0.75)
+
+    # Add grid lines along the y-axis for better readability
+    ax.grid(axis='y', linestyle='--', alpha=0.6)
+
+    # Add labels for axes
+    ax.set_xlabel('Delivery Time (Days)', fontsize=14, labelpad=10)
+    ax.set_ylabel('Number of Orders', fontsize=14, labelpad=10)
+
+    # Add a title to the plot
+    ax.set_title('Distribution of Delivery Time Across Brazil', fontsize=16, fontweight='bold', pad=15)
+
+    # Adding annotations for each bar to display the count
+    for i in range(len(patches)):
+        height = n[i]
+        if height > 0:
+            ax.text(
+                patches[i].get_x() + patches[i].get_width() / 2,
+                height + max(n) * 0.02,
+                f'{int(height)}',
+                ha='center',
+                va='bottom',
+                fontsize=10,
+                color='black'
+            )
+
+    # Highlighting specific bins
+    for patch in patches:
+        if patch.get_height() > 5000:
+            patch.set_facecolor('#FFA07A')
+        else:
+            patch.set_facecolor('#87CEFA')
+
+    # Adding a legend to explain the bar colors
+    legend_elements = [
+        Patch(facecolor='#FFA07A', edgecolor='black', label='High Count (> 5000 Orders)'),
+        Patch(facecolor='#87CEFA', edgecolor='black', label='Moderate Count')
+    ]
+    ax.legend(handles=legend_elements, loc='upper right', fontsize=12, title="Order Count Categories")
+
+    # Adding some visual separation at the borders of the bars
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    add_footer(fig)
+    return fig
+
+
+def recency_histogram(recency_counts):
+    """Tab 2: histogram of days since the last purchase from customer counts per recency."""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    n, bins, patches = ax.hist(recency_counts.index, weights=recency_counts.values, bins=20, edgecolor='black',
+                               color='#4682B4', alpha=0.7)
+
+    # Add grid lines for better readability
+    ax.grid(axis='y', linestyle='--', alpha=0.6)
+
+    # Set the labels and title for the plot
+    ax.set_xlabel('Days Since Last Purchase', fontsize=14, labelpad=10)
+    ax.set_ylabel('Number of Customers', fontsize=14, labelpad=10)
+    ax.set_title('Recency Distribution of Customers', fontsize=16, fontweight='bold', pad=15)
+
+    # Add annotations to each bar to display the count
+    for i in range(len(patches)):
+        height = n[i]
+        if height > 0:
+            ax.text(
+                patches[i].get_x() + patches[i].get_width() / 2,
+                height + 50,
+                f'{int(height)}',
+                ha='center',
+                va='bottom',
+                fontsize=10,
+                color='black'
+            )
+
+    add_footer(fig)
+    return fig
+
+
+def frequency_histogram(frequency_counts, years_str, quarters_str):
+    """Tab 3: log-scale histogram of purchase frequency from customer counts per frequency."""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    n, bins, patches = ax.hist(
+        frequency_counts.index,
+        weights=frequency_counts.values,
+        bins=15,
+        edgecolor='black',
+        log=True,
+        color='lightcoral',
+        alpha=0.75
+    )
+
+    # Set labels and title with increased font size and bold styling
+    ax.set_xlabel('Number of Purchases (Frequency)', fontsize=14)
+    ax.set_ylabel('Number of Customers (Log Scale)', fontsize=14)
+    ax.set_title(
+        f'Frequency of Purchases by Customers in Year(s): {years_str}, Quarter(s): {quarters_str} (Log Scale)',
+        fontsize=16, weight='bold')
+
+    # Adding grid lines for better readability
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    # Adding text annotations for each bar
+    for i in range(len(patches)):
+        height = n[i]
+        if height > 0:
+            ax.text(
+                patches[i].get_x() + patches[i].get_width() / 2,
+                height,
+                f'{int(height)}',
+                ha='center',
+                va='bottom',
+                fontsize=10,
+                color='black',  # Use a contrasting color to make text annotations visible
+                fontweight='bold'
+            )
+
+    # Set limits and style for the y-axis
+    ax.set_ylim(bottom=0.5)
+    ax.set_yscale('log')
+    ax.set_yticks([1, 10, 100, 1000, 10000])
+    ax.set_yticklabels(['1', '10', '100', '1K', '10K'])  # Customize tick labels
+
+    # Add some decorative elements
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    # Adding a legend to clarify that the bars represent frequency counts
+    ax.legend(['Customer Frequency'], loc='upper right', fontsize=12, title='Legend')
+
+    add_footer(fig)
+    return fig
+
+
+def expenditure_boxplot(box_stats, selected_years_str, relative_error=None):
+    """Tab 4: box plot of customer expenditure from precomputed box plot statistics.
+
+    ``relative_error`` is the accuracy of approximate statistics, stated next to the median.
+    """
+    plot_title = f"Boxplot of Customer Expenditure in {selected_years_str}"
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+
+    # Draw the boxplot with enhancements from the sketch quartiles, whiskers and sampled outliers
+    ax.bxp(
+        [box_stats],
+        vert=False,
+        showfliers=True,
+        patch_artist=True,
+        boxprops=dict(facecolor='lightblue', color='navy', linewidth=1.5),
+        medianprops=dict(color='red', linewidth=2),
+        whiskerprops=dict(color='navy', linestyle='--', linewidth=1.5),
+        capprops=dict(color='navy', linewidth=1.5),
+        flierprops=dict(marker='o', markerfacecolor='orange', markeredgecolor='orange', alpha=0.5, markersize=6)
+    )
+
+    # Set the labels and title
+    ax.set_xlabel('Total Expenditure (BRL)', fontsize=14)
+    ax.set_title(plot_title, fontsize=16, weight='bold')
+    ax.set_yticks([])  # Remove y-axis ticks since we have a single boxplot
+
+    # Adding grid for better readability
+    ax.grid(axis='x', linestyle='--', alpha=0.7)
+
+    # Highlight the median value with annotation
+    median = box_stats['med']
+    error = f' (±{relative_error:.1%})' if relative_error else ''
+    ax.annotate(
+        f'Median: {median:.2f}{error}',
+        xy=(median, 1),
+        xytext=(median + 200, 1.1),
+        arrowprops=dict(facecolor='black', arrowstyle='->', lw=1.5),
+        fontsize=12, color='darkred'
+    )
+
+    # Add some decorations to make it more polished
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    add_footer(fig)
+    return fig
+
+
+def segmentation_chart(segment_counts, selected_years_str):
+    """Tab 6: bar chart of the number of customers in each purchase frequency segment."""
+    # Define labels and colors for the segments
+    segment_labels = ['Low Frequency (1 Purchase)',
+                      'Medium Frequency (2-3 Purchases)',
+                      'High Frequency (4-10 Purchases)',
+                      'Very High Frequency (> 10 Purchases)']
+    segment_label_x = ['Low',
+                       'Medium',
+                       'High',
+                       'Very High']
+    segment_colors = ['skyblue', 'orange', 'green', 'red']
+
+    # Create the bar chart with labels on the x-axis
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    bars = ax.bar(segment_label_x, segment_counts, color=segment_colors, edgecolor='black')
+
+    # Adding text annotations for each bar, positioned more precisely
+    for i, bar in enumerate(bars):
+        ax.text(
+            bar.get_x() + bar.get_width() / 2,
+            bar.get_height() + (bar.get_height() * 0.02),
+            f'{int(bar.get_height())} Customers',
+            ha='center',
+            va='bottom',
+            fontsize=10,
+            fontweight='bold',
+            color='black'
+        )
+
+    # Set the title based on selected years
+    plot_title = f"Customer Segmentation Based on Purchase Frequency in Year(s): {selected_years_str}"
+
+    # Adding labels and title
+    ax.set_xlabel('Customer Segment', fontsize=14)
+    ax.set_ylabel('Number of Customers', fontsize=14)
+    ax.set_title(plot_title, fontsize=16, weight='bold')
+
+    # Set x-axis labels at a 45-degree angle for better readability
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+
+    # Adding the legend
+    ax.legend(
+        handles=bars,
+        labels=segment_labels,
+        loc='upper right',
+        shadow=True,
+        fontsize='medium',
+        title="Purchase Frequency Segments"
+    )
+
+    # Remove top and right spines for better aesthetics
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    # Adding gridlines for better readability
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    return fig
+
+
+def render_figure(fig, image_format="png"):
+    """Render a figure to PNG or SVG bytes and release it."""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=image_format, **SAVEFIG_OPTIONS)
+    finally:
+        fig.clf()
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """Thread-safe LRU cache of rendered figure bytes, bounded by total size and entry count."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=512):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        # An image larger than the whole bound would only evict every other image before itself
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._images:
+                self.total_bytes -= len(self._images.pop(key))
+            self._images[key] = image
+            self.total_bytes += len(image)
+            # Evict the least recently used images until both bounds hold again
+            while self._images and (self.total_bytes > self.max_bytes or len(self._images) > self.max_entries):
+                _, evicted = self._images.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def get_or_render(self, key, build, image_format="png"):
+        """Return the cached image for ``key``, rendering ``build()`` into it on a miss."""
+        key = (key, image_format)
+        image = self.get(key)
+        if image is None:
+            image = render_figure(build(), image_format)
+            self.put(key, image)
+        return image
+
+    def discard(self, predicate):
+        """Drop the images whose key matches ``predicate``, e.g. those of an older data version."""
+        with self._lock:
+            for key in [key for key in self._images if predicate(key)]:
+                self.total_bytes -= len(self._images.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._images)
+
+
+RENDER_WORKERS_ENV = "DASHBOARD_RENDER_WORKERS"
+
+
+def default_workers():
+    """Worker processes from ``DASHBOARD_RENDER_WORKERS``, by default one per core up to four."""
+    workers = os.environ.get(RENDER_WORKERS_ENV)
+    if workers is not None:
+        return int(workers)
+    # On a single core a pool only adds the cost of sending charts between processes
+    cores = os.cpu_count() or 1
+    return min(4, cores) if cores > 1 else 0
+
+
+def _warm_worker():
+    # Draw a throwaway figure so the first real chart does not pay for matplotlib's font and backend setup
+    render_figure(Figure(figsize=(1, 1)))
+    return os.getpid()
+
+
+def render_chart(builder, args, image_format="png"):
+    """Build a figure with ``builder(*args)`` and render it; runs inside the worker processes."""
+    return render_figure(builder(*args), image_format)
+
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    """A spawned render worker that starts without the parent's ``__main__``.
+
+    Spawn runs the parent's ``__main__`` again in every new process (as
+    ``__mp_main__``). Under ``streamlit run`` that is dashboard.py, so each
+    worker would load its own data snapshot, start a refresher and draw a
+    view. The workers only need this module, so an empty ``__main__`` stands
+    in for the app while the process starts.
+    """
+
+    def start(self):
+        app_main = sys.modules["__main__"]
+        worker_main = types.ModuleType("__main__")
+        sys.modules["__main__"] = worker_main
+        try:
+            super().start()
+        finally:
+            # A script run started meanwhile installs its own __main__, keep that one
+            if sys.modules["__main__"] is worker_main:
+                sys.modules["__main__"] = app_main
+
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+
+class RenderService:
+    """Render figures in a process pool, through a ``FigureCache``.
+
+    ``builder`` must be a module-level function of this module (it is sent to
+    the workers by name) and ``args`` small picklable inputs such as value
+    counts or box plot statistics.
+    """
+
+    def __init__(self, cache=None, workers=None):
+        self.cache = cache if cache is not None else FigureCache()
+        self.workers = default_workers() if workers is None else workers
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None and self.workers > 0:
+            # Fresh interpreters rather than forks of the threaded server process, which don't run the app
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_WorkerContext())
+            # Workers start on demand, start them all now so the first charts already render in parallel
+            for _ in range(self.workers):
+                self._pool.submit(_warm_worker)
+        return self._pool
+
+    def start(self):
+        """Start the worker processes ahead of the first chart."""
+        with self._lock:
+            self._executor()
+        return self
+
+    def submit(self, key, builder, *args, image_format="png"):
+        """Return a future of the image for ``key``, rendering ``builder(*args)`` on a cache miss."""
+        cache_key = (key, image_format)
+        with self._lock:
+            image = self.cache.get(cache_key)
+            if image is not None:
+                future = Future()
+                future.set_result(image)
+                return future
+            # Another session is already rendering this chart, wait for the same result
+            if cache_key in self._pending:
+                return self._pending[cache_key]
+            executor = self._executor()
+            future = Future() if executor is None else executor.submit(render_chart, builder, args, image_format)
+            self._pending[cache_key] = future
+
+        def store(done):
+            with self._lock:
+                self._pending.pop(cache_key, None)
+            if done.exception() is None:
+                self.cache.put(cache_key, done.result())
+
+        future.add_done_callback(store)
+        if executor is None:
+            # Without workers, render in the calling thread but outside the lock: other sessions' cache
+            # lookups carry on meanwhile, and requests for the same chart wait on this future
+            try:
+                future.set_result(render_chart(builder, args, image_format))
+            except Exception as error:
+                future.set_exception(error)
+        return future
+
+    def render(self, key, builder, *args, image_format="png"):
+        """Return the image for ``key``, rendering it in a worker process on a cache miss."""
+        try:
+            return self.submit(key, builder, *args, image_format=image_format).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); restart the pool and render this chart in-process
+            with self._lock:
+                self._pool = None
+                self._pending.pop((key, image_format), None)
+            image = render_chart(builder, args, image_format)
+            self.cache.put((key, image_format), image)
+            return image
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,162 @@
+"""Cached, simplified Brazil state boundaries and the tab5 choropleth built on them.
+
+``map/brazil-states.geojson`` is 3.3 MB of full-resolution polygons. It is
+loaded once per process, simplified with the Douglas-Peucker algorithm at a
+configurable tolerance (in degrees) and indexed by state code (``sigla``).
+Purchase counts are joined through that index, and the map is drawn with a
+single GeoJSON layer so the geometry is serialized into the HTML only once.
+
+A click on a state posts ``{"type": "purchase_map:click", "state": sigla}``
+to the parent window, where the ``purchase_map`` component of the dashboard
+passes it back to Streamlit.
+"""
+import functools
+import json
+from pathlib import Path
+
+import folium
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+GEOJSON_PATH = Path(__file__).parent.parent / 'map' / 'brazil-states.geojson'
+
+# Default simplification tolerance in degrees (about 1 km) and coordinate precision
+SIMPLIFY_TOLERANCE = 0.01
+COORDINATE_DECIMALS = 4
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of a closed ring given as an (n, 2) array."""
+    if len(points) <= 4 or tolerance <= 0:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    simplified = points[keep]
+    # A closed ring needs at least four points, fall back to the original for tiny islands
+    return simplified if len(simplified) >= 4 else points
+
+
+def simplify_geometry(geometry, tolerance):
+    def simplify_polygon(rings):
+        return [np.round(simplify_ring(np.asarray(ring, dtype=float), tolerance),
+                         COORDINATE_DECIMALS).tolist() for ring in rings]
+
+    if geometry['type'] == 'Polygon':
+        coordinates = simplify_polygon(geometry['coordinates'])
+    elif geometry['type'] == 'MultiPolygon':
+        coordinates = [simplify_polygon(polygon) for polygon in geometry['coordinates']]
+    else:
+        return geometry
+    return {'type': geometry['type'], 'coordinates': coordinates}
+
+
+@functools.lru_cache(maxsize=4)
+def load_states(tolerance=SIMPLIFY_TOLERANCE, path=GEOJSON_PATH):
+    """Load the state boundaries once per tolerance, simplified and indexed by ``sigla``."""
+    with open(path, 'r') as f:
+        brazil_geo = json.load(f)
+    states = {}
+    for feature in brazil_geo['features']:
+        properties = feature['properties']
+        states[properties['sigla']] = {
+            'type': 'Feature',
+            'properties': {'sigla': properties['sigla'], 'name': properties['name']},
+            'geometry': simplify_geometry(feature['geometry'], tolerance),
+        }
+    return states
+
+
+def join_purchases(states, state_purchases):
+    """Return a FeatureCollection with ``total_purchases`` set on every state.
+
+    ``state_purchases`` maps state codes to purchase counts. The cached
+    geometries are shared, only the properties are copied.
+    """
+    features = []
+    for sigla, feature in states.items():
+        properties = dict(feature['properties'], total_purchases=int(state_purchases.get(sigla, 0)))
+        features.append({'type': 'Feature', 'properties': properties, 'geometry': feature['geometry']})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+class StateClickReporter(MacroElement):
+    """Post the code of every state clicked on ``layer`` to the parent window."""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this.layer.get_name() }}.on("click", function (e) {
+            var feature = (e.propagatedFrom || e.layer).feature;
+            window.parent.postMessage({type: "purchase_map:click", state: feature.properties.sigla}, "*");
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer):
+        super().__init__()
+        self._name = "StateClickReporter"
+        self.layer = layer
+
+
+def build_purchase_map(state_purchases, tolerance=SIMPLIFY_TOLERANCE):
+    """Build the folium choropleth of purchases per state.
+
+    ``state_purchases`` is a DataFrame with ``state`` and ``total_purchases`` columns.
+    """
+    purchases = dict(zip(state_purchases['state'], state_purchases['total_purchases']))
+    brazil_geo = join_purchases(load_states(tolerance), purchases)
+
+    # Create a base map centered around Brazil
+    brazil_map = folium.Map(location=[-14.2350, -51.9253], zoom_start=4, tiles='cartodbpositron')
+
+    # Add the Choropleth layer for visualizing the number of purchases by state
+    choropleth = folium.Choropleth(
+        geo_data=brazil_geo,
+        name='choropleth',
+        data=state_purchases,
+        columns=['state', 'total_purchases'],
+        key_on='feature.properties.sigla',
+        fill_color='YlGnBu',
+        fill_opacity=0.7,
+        line_opacity=0.5,
+        line_color='black',
+        legend_name='Number of Purchases by State',
+        highlight=True
+    ).add_to(brazil_map)
+
+    # Attach the tooltips showing state name, state code, and total purchases to the same layer,
+    # instead of serializing the polygons a second time in a separate GeoJson layer
+    folium.GeoJsonTooltip(
+        fields=['sigla', 'name', 'total_purchases'],
+        aliases=['State Code:', 'State Name:', 'Total Purchases:'],
+        localize=True
+    ).add_to(choropleth.geojson)
+    StateClickReporter(choropleth.geojson).add_to(brazil_map)
+
+    # Add a layer control panel to the map
+    folium.LayerControl(collapsed=False).add_to(brazil_map)
+    return brazil_map
+
+
+def render_purchase_map(state_purchases, tolerance=SIMPLIFY_TOLERANCE):
+    """Render the purchase map to a standalone HTML page."""
+    figure = folium.Figure().add_child(build_purchase_map(state_purchases, tolerance))
+    return figure.render()
@@ -0,0 +1,232 @@
+"""Per-rerun profiling of the dashboard's hot path.
+
+Every Streamlit rerun gets a ``RerunTrace`` that times each stage of each tab
+(data load, cube lookups, figure building/rendering, map HTML, display) and
+records the change in resident memory across it. ``cached`` wraps
+``st.cache_data``/``st.cache_resource`` so the calls and misses of every
+cached loader are counted process-wide; the hits are the difference.
+
+Instrumentation is opt-in: start the app with ``DASHBOARD_DEBUG=1`` or open it
+with ``?debug=1`` to record spans and show the debug panel in the sidebar. The
+panel exports the recorded reruns as JSON or in the Chrome trace event format,
+which opens in ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+DEBUG_ENV = "DASHBOARD_DEBUG"
+
+# Reruns kept per session for the trace export
+TRACE_HISTORY = 20
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    # /proc is Linux only, fall back to the peak elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes."""
+    # ru_maxrss is in kilobytes, except on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RerunTrace:
+    """Timed spans of one script run; records nothing when disabled."""
+
+    def __init__(self, enabled=True, run_id=0):
+        self.enabled = enabled
+        self.run_id = run_id
+        self.spans = []
+        self.start = time.perf_counter()
+        self.start_time = time.time()
+        self.rss_start = current_rss() if enabled else 0
+        self.end = None
+
+    @contextmanager
+    def span(self, tab, stage):
+        if not self.enabled:
+            yield
+            return
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            rss_after = current_rss()
+            self.spans.append({
+                "tab": tab,
+                "stage": stage,
+                "start_seconds": start - self.start,
+                "wall_seconds": end - start,
+                "rss_after_bytes": rss_after,
+                "rss_delta_bytes": rss_after - rss_before,
+            })
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def total_seconds(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "started_at": self.start_time,
+            "total_seconds": self.total_seconds,
+            "rss_start_bytes": self.rss_start,
+            "spans": self.spans,
+        }
+
+
+class CacheStats:
+    """Thread-safe call and miss counters of the cached loaders, shared by all sessions."""
+
+    def __init__(self):
+        self.calls = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def record_miss(self, name):
+        with self._lock:
+            self.misses[name] = self.misses.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return [{"function": name, "calls": calls, "misses": self.misses.get(name, 0),
+                     "hits": calls - self.misses.get(name, 0)} for name, calls in self.calls.items()]
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
+            self.misses.clear()
+
+
+CACHE_STATS = CacheStats()
+
+
+def cached(cache_decorator, name=None, stats=CACHE_STATS):
+    """Apply ``cache_decorator`` (e.g. ``st.cache_data``) and count the calls and misses of the function.
+
+    The wrapped body only runs on a cache miss, so counting inside it gives the
+    misses while the outer wrapper counts every call.
+    """
+    def decorate(func):
+        key = name or func.__name__
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            stats.record_miss(key)
+            return func(*args, **kwargs)
+
+        cached_func = cache_decorator(compute)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            stats.record_call(key)
+            return cached_func(*args, **kwargs)
+
+        call.clear = cached_func.clear
+        return call
+
+    return decorate
+
+
+def chrome_trace(traces):
+    """Convert recorded reruns to the Chrome trace event format.
+
+    Each rerun is a thread of complete ("X") events, one per span, plus a
+    counter track of the resident memory after each span.
+    """
+    pid = os.getpid()
+    events = []
+    for trace in traces:
+        run_start = trace["started_at"] * 1e6
+        tid = trace["run_id"]
+        events.append({"name": "rerun", "cat": "rerun", "ph": "X", "ts": run_start,
+                       "dur": trace["total_seconds"] * 1e6, "pid": pid, "tid": tid})
+        for span in trace["spans"]:
+            ts = run_start + span["start_seconds"] * 1e6
+            events.append({
+                "name": f"{span['tab']}:{span['stage']}",
+                "cat": span["tab"],
+                "ph": "X",
+                "ts": ts,
+                "dur": span["wall_seconds"] * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {"rss_delta_bytes": span["rss_delta_bytes"]},
+            })
+            events.append({"name": "rss", "ph": "C", "ts": ts + span["wall_seconds"] * 1e6, "pid": pid,
+                           "args": {"MiB": span["rss_after_bytes"] / 2 ** 20}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def debug_enabled(query_params=None):
+    """Whether profiling is switched on by the environment or the ``?debug=1`` query parameter."""
+    if os.environ.get(DEBUG_ENV, "") not in ("", "0"):
+        return True
+    return query_params is not None and query_params.get("debug", "0") not in ("", "0")
+
+
+def show_debug_panel(container, trace, history, figure_cache=None, snapshot=None, stats=CACHE_STATS):
+    """Draw the profile of the current rerun, the cache counters and the trace exports in ``container``."""
+    panel = container.expander("🛠 Debug: rerun profile", expanded=True)
+    rss = current_rss()
+    panel.metric("Rerun time", f"{trace.total_seconds * 1000:.0f} ms",
+                 help="Wall time of this view run up to the panel")
+    panel.metric("Resident memory", f"{rss / 2 ** 20:.0f} MiB",
+                 delta=f"{(rss - trace.rss_start) / 2 ** 20:+.1f} MiB", delta_color="off")
+    if snapshot is not None:
+        loaded_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.loaded_at))
+        panel.caption(f"Data version {snapshot.version} (snapshot {snapshot.generation}, loaded {loaded_at})")
+
+    if trace.spans:
+        spans = pd.DataFrame(trace.spans)
+        spans["ms"] = (spans["wall_seconds"] * 1000).round(2)
+        spans["rss_delta_MiB"] = (spans["rss_delta_bytes"] / 2 ** 20).round(2)
+        panel.caption("Stages of this rerun")
+        panel.dataframe(spans[["tab", "stage", "ms", "rss_delta_MiB"]], hide_index=True)
+
+    cache_rows = stats.snapshot()
+    if figure_cache is not None:
+        cache_rows.append({"function": "FigureCache images", "calls": figure_cache.hits + figure_cache.misses,
+                           "misses": figure_cache.misses, "hits": figure_cache.hits})
+    if cache_rows:
+        panel.caption("Cache hits and misses since the server started")
+        panel.dataframe(pd.DataFrame(cache_rows), hide_index=True)
+
+    # The current rerun is exported with the earlier ones of this session
+    runs = list(history) + [trace.to_dict()]
+    panel.download_button("Export Chrome trace", json.dumps(chrome_trace(runs)),
+                          file_name="dashboard_trace.json", mime="application/json")
+    panel.download_button("Export spans (JSON)", json.dumps(runs, indent=2),
+                          file_name="dashboard_spans.json", mime="application/json")
+
+
+def session_history(session_state):
+    """The traces of the earlier reruns of a session, the oldest dropped beyond ``TRACE_HISTORY``."""
+    if "profile_history" not in session_state:
+        session_state["profile_history"] = deque(maxlen=TRACE_HISTORY)
+    return session_state["profile_history"]
@@ -0,0 +1,177 @@
+"""ETL pipeline that builds ``all_data`` and ``rfm_data`` from the raw Olist tables.
+
+Run it from the repository root with::
+
+    python dashboard/pipeline.py
+
+The raw ``data/olist_*.csv`` tables are first ingested into the Parquet store
+(see ``data_store.py``). Orders are then processed one year/quarter partition
+at a time: each batch is joined with its order items and customers (read with
+the batch's ids pushed down to the Parquet scan) and with the small product,
+category translation and seller reference tables. Only one batch plus the
+per-customer RFM partials are held in memory, so the pipeline scales with the
+size of a quarter rather than with the full order history.
+
+New orders can be merged in without a rebuild::
+
+    python dashboard/pipeline.py --append path/to/new_batch
+
+where ``new_batch`` holds the new rows of the orders, order items and
+customers tables. See ``rfm.py`` for how rfm_data is updated incrementally and
+``cube.update_cube`` for the cube.
+"""
+import argparse
+from pathlib import Path
+
+import cube
+import data_store
+import rfm as rfm_engine
+
+REQUIRED_TABLES = [
+    "olist_orders_dataset",
+    "olist_order_items_dataset",
+    "olist_customers_dataset",
+    "olist_products_dataset",
+    "olist_sellers_dataset",
+]
+
+ORDER_COLUMNS = [
+    "order_id", "customer_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+    "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+]
+ITEM_COLUMNS = ["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"]
+CUSTOMER_COLUMNS = ["customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city",
+                    "customer_state"]
+SELLER_COLUMNS = ["seller_id", "seller_zip_code_prefix", "seller_city", "seller_state"]
+
+# Raw tables that grow with new orders; the others are reference tables
+DELTA_TABLES = ["olist_orders_dataset", "olist_order_items_dataset", "olist_customers_dataset"]
+
+
+def check_sources(store_path=None):
+    """Raise if any raw table needed by the pipeline is neither in the store nor in data/."""
+    missing = [name for name in REQUIRED_TABLES if not data_store.dataset_exists(name, store_path)]
+    if missing:
+        raise FileNotFoundError(
+            f"Missing raw tables: {', '.join(missing)}. Place the Olist CSV files in {data_store.RAW_DATA_PATH}.")
+
+
+def join_orders(orders, products, sellers, store_path=None):
+    """Join one batch of orders with its items, customers, products and sellers."""
+    order_ids = orders["order_id"].unique()
+    items = data_store.read_dataset("olist_order_items_dataset", columns=ITEM_COLUMNS,
+                                    where={"order_id": order_ids}, store_path=store_path)
+    customers = data_store.read_dataset("olist_customers_dataset", columns=CUSTOMER_COLUMNS,
+                                        where={"customer_id": orders["customer_id"].unique()},
+                                        store_path=store_path)
+
+    joined = orders.merge(customers, on="customer_id", how="left")
+    joined = joined.merge(items, on="order_id", how="left")
+    joined = joined.merge(products, on="product_id", how="left")
+    joined = joined.merge(sellers, on="seller_id", how="left")
+
+    # Whole days between purchase and delivery, NaN for orders that were never delivered
+    delivery_time = joined["order_delivered_customer_date"] - joined["order_purchase_timestamp"]
+    joined["delivery_time_days"] = delivery_time.dt.days
+    return data_store.apply_schema(joined, "all_data")
+
+
+def run(source_path=None, store_path=None, write_csv=False, skip_ingest=False):
+    """Build all_data and rfm_data, returning their row counts."""
+    if not skip_ingest:
+        data_store.ingest_raw(source_path, store_path)
+    check_sources(store_path)
+
+    products = data_store.read_products(store_path)
+    sellers = data_store.read_dataset("olist_sellers_dataset", columns=SELLER_COLUMNS, store_path=store_path)
+
+    partials = []
+    csv_file = data_store.csv_path("all_data")
+
+    def joined_batches():
+        for i, orders in enumerate(data_store.iter_dataset("olist_orders_dataset", columns=ORDER_COLUMNS,
+                                                           store_path=store_path)):
+            joined = join_orders(orders, products, sellers, store_path)
+            partials.append(rfm_engine.rfm_partials(joined))
+            if write_csv:
+                joined.to_csv(csv_file, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            yield joined
+
+    all_data_rows = data_store.write_dataset(joined_batches(), "all_data", store_path=store_path)
+
+    rfm = rfm_engine.merge_partials(partials)
+    rfm_engine.write_rfm(rfm, store_path)
+    if write_csv:
+        rfm = rfm_engine.add_recency(rfm, rfm["last_purchase"].max())
+        rfm[rfm_engine.RFM_COLUMNS].to_csv(data_store.csv_path("rfm_data"), index=False)
+
+    cube.write_cube(cube.build_cube(store_path), store_path)
+    return {"all_data": all_data_rows, "rfm_data": len(rfm)}
+
+
+def append(source_path, store_path=None):
+    """Merge a batch of new orders into the store without rebuilding it.
+
+    ``source_path`` holds only the new rows of the orders, order items and
+    customers tables. They are appended to the raw tables, joined, appended to
+    all_data and folded into rfm_data, touching only the quarters they fall in.
+
+    The batch is checked before anything is written: it must contain the
+    orders table, and none of its orders may be in the store already, so a
+    batch that went through is not counted twice when it is retried.
+    """
+    source_path = Path(source_path)
+    orders_path = source_path / "olist_orders_dataset.csv"
+    if not orders_path.exists():
+        raise FileNotFoundError(f"The batch in {source_path} has no olist_orders_dataset.csv.")
+    check_sources(store_path)
+    new_orders = data_store.read_csv(orders_path, "olist_orders_dataset", columns=["order_id"])
+    applied = data_store.read_dataset("olist_orders_dataset", columns=["order_id"],
+                                      where={"order_id": new_orders["order_id"]}, store_path=store_path)
+    if not applied.empty:
+        raise ValueError(f"{len(applied)} orders of the batch in {source_path} are already in the store "
+                         f"(e.g. {applied['order_id'].iloc[0]}), was it appended before?")
+
+    for name in DELTA_TABLES:
+        path = source_path / f"{name}.csv"
+        if path.exists():
+            data_store.ingest_csv(name, path, store_path=store_path, append=True)
+
+    orders = data_store.read_dataset("olist_orders_dataset", columns=ORDER_COLUMNS,
+                                     where={"order_id": new_orders["order_id"]}, store_path=store_path)
+    products = data_store.read_products(store_path)
+    sellers = data_store.read_dataset("olist_sellers_dataset", columns=SELLER_COLUMNS, store_path=store_path)
+    joined = join_orders(orders, products, sellers, store_path)
+
+    all_data_rows = data_store.write_dataset([joined], "all_data", store_path=store_path, append=True)
+    rfm_rows = rfm_engine.update_rfm(joined, store_path)
+
+    # Only the cube slices of the batch's quarters are recomputed, plus recency (see cube.update_cube)
+    cube.update_cube(joined, store_path)
+    return {"all_data": all_data_rows, "rfm_data": rfm_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build all_data and rfm_data from the raw Olist tables.")
+    parser.add_argument("--source", type=Path, default=data_store.RAW_DATA_PATH,
+                        help="Directory with the raw olist_*.csv tables")
+    parser.add_argument("--store", type=Path, default=data_store.STORE_PATH,
+                        help="Output directory for the Parquet store")
+    parser.add_argument("--csv", action="store_true",
+                        help="Also write all_data.csv and rfm_data.csv next to dashboard.py")
+    parser.add_argument("--skip-ingest", action="store_true",
+                        help="Reuse the raw tables already in the store instead of re-ingesting the CSV files")
+    parser.add_argument("--append", type=Path, metavar="BATCH_DIR",
+                        help="Merge the new orders in BATCH_DIR into the existing store instead of rebuilding it")
+    args = parser.parse_args()
+
+    if args.append:
+        counts = append(args.append, args.store)
+    else:
+        counts = run(args.source, args.store, write_csv=args.csv, skip_ingest=args.skip_ingest)
+    for name, rows in counts.items():
+        print(f"{name}: {rows} rows -> {data_store.dataset_path(name, args.store)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Interactive Plotly versions of the dashboard charts.
+
+The matplotlib charts in ``figures.py`` reach the browser as static images, so
+looking closer at a bar means changing a filter and waiting for a rerun. These
+charts are drawn by Plotly in the browser instead: hovering, zooming and
+panning happen client side without running the script again.
+
+They are built from the same small aggregates as the images, and the payload
+sent to the browser stays bounded however many rows the data has:
+
+* histograms are sent as their fixed bins, never as the raw values
+* per-day series (delivery time, recency) are downsampled with
+  Largest-Triangle-Three-Buckets (``lttb``) to at most ``MAX_POINTS`` points
+  and drawn as WebGL (``Scattergl``) traces
+* the box plot is sent as its five statistics and the capped outlier sample
+"""
+import datetime
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Most points of a downsampled series sent to the browser
+MAX_POINTS = 1000
+
+# Number of bars of the recency and frequency histograms, as in figures.py
+RECENCY_BINS = 20
+FREQUENCY_BINS = 15
+
+# Options of the Plotly toolbar passed to st.plotly_chart
+CONFIG = {"displaylogo": False, "scrollZoom": True}
+
+
+def lttb(x, y, threshold=MAX_POINTS):
+    """Downsample a series to at most ``threshold`` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; in between, each bucket keeps the point
+    forming the largest triangle with the point kept before it and the average
+    of the next bucket, which preserves the peaks and troughs of the shape.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # threshold - 2 buckets between the first and the last point, each holding at least one point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[stop:edges[bucket + 2]].mean(), y[stop:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[bucket + 1] = previous
+    return x[keep], y[keep]
+
+
+def _binned(counts, bins):
+    # Fixed-width bins of a Series of counts indexed by value, like hist(values, weights=counts)
+    bin_counts, edges = np.histogram(counts.index.to_numpy(dtype=float), bins=bins,
+                                     weights=counts.to_numpy(dtype=float))
+    return bin_counts, edges
+
+
+def _bars(bin_counts, edges, color, name):
+    return go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=bin_counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="%{customdata[0]:.0f} - %{customdata[1]:.0f}: %{y:,.0f}<extra></extra>",
+        marker=dict(color=color, line=dict(color="black", width=1)),
+        opacity=0.75,
+        name=name,
+    )
+
+
+def _series(counts, name, color):
+    # Per-value counts as a WebGL line, downsampled for the browser
+    x, y = lttb(counts.index.to_numpy(dtype=float), counts.to_numpy(dtype=float))
+    return go.Scattergl(x=x, y=y, mode="lines", name=name, line=dict(color=color, width=1.5),
+                        hovertemplate="%{x:.0f}: %{y:,.0f}<extra></extra>")
+
+
+def _layout(fig, title, xaxis_title, yaxis_title, **layout):
+    options = dict(
+        title=dict(text=f"<b>{title}</b>", x=0.5),
+        xaxis_title=xaxis_title,
+        yaxis_title=yaxis_title,
+        template="simple_white",
+        hovermode="closest",
+        bargap=0,
+        legend=dict(orientation="h", yanchor="bottom", y=1.0, xanchor="right", x=1.0),
+        margin=dict(t=80, b=80),
+    )
+    options.update(layout)
+    fig.update_layout(**options)
+    fig.update_yaxes(showgrid=True, griddash="dash")
+    fig.add_annotation(text=f"© {datetime.datetime.now().year} Mohammad Raya Satriatama. All rights reserved.",
+                       xref="paper", yref="paper", x=0.5, y=-0.25, showarrow=False,
+                       font=dict(size=10, color="gray"))
+    return fig
+
+
+def delivery_histogram(bin_counts, bin_edges, delivery_counts):
+    """Tab 1: delivery time histogram over the fixed bins, with the per-day order counts to zoom into."""
+    # Bars over 5000 orders are highlighted like in the static chart
+    colors = np.where(np.asarray(bin_counts) > 5000, "#FFA07A", "#87CEFA")
+    fig = go.Figure([
+        _bars(bin_counts, bin_edges, colors, "Orders per bin"),
+        _series(delivery_counts, "Orders per day", "navy"),
+    ])
+    return _layout(fig, "Distribution of Delivery Time Across Brazil", "Delivery Time (Days)", "Number of Orders")
+
+
+def recency_histogram(recency_counts):
+    """Tab 2: recency histogram, with the customers per day since their last purchase to zoom into."""
+    bin_counts, edges = _binned(recency_counts, RECENCY_BINS)
+    fig = go.Figure([
+        _bars(bin_counts, edges, "#4682B4", "Customers per bin"),
+        _series(recency_counts, "Customers per day", "darkorange"),
+    ])
+    return _layout(fig, "Recency Distribution of Customers", "Days Since Last Purchase", "Number of Customers")
+
+
+def frequency_histogram(frequency_counts, years_str, quarters_str):
+    """Tab 3: log-scale histogram of purchase frequency."""
+    bin_counts, edges = _binned(frequency_counts, FREQUENCY_BINS)
+    fig = go.Figure([_bars(bin_counts, edges, "lightcoral", "Customers")])
+    return _layout(fig, f"Frequency of Purchases by Customers in Year(s): {years_str}, Quarter(s): {quarters_str}",
+                   "Number of Purchases (Frequency)", "Number of Customers (Log Scale)",
+                   yaxis_type="log", showlegend=False)
+
+
+def expenditure_boxplot(box_stats, selected_years_str, relative_error=None):
+    """Tab 4: box plot of customer expenditure from precomputed statistics and sampled outliers."""
+    fig = go.Figure([
+        go.Box(
+            q1=[box_stats["q1"]], median=[box_stats["med"]], q3=[box_stats["q3"]],
+            lowerfence=[box_stats["whislo"]], upperfence=[box_stats["whishi"]],
+            y=["Customers"], orientation="h", name="Customers", boxpoints=False,
+            fillcolor="lightblue", line=dict(color="navy"),
+        ),
+        go.Scattergl(
+            x=np.asarray(box_stats["fliers"], dtype=float), y=["Customers"] * len(box_stats["fliers"]),
+            mode="markers", name="Outliers (sample)", marker=dict(color="orange", opacity=0.5, size=6),
+            hovertemplate="%{x:,.2f} BRL<extra></extra>",
+        ),
+    ])
+    error = f" (±{relative_error:.1%})" if relative_error else ""
+    fig.add_annotation(x=box_stats["med"], y=0.35, text=f"Median: {box_stats['med']:.2f}{error}",
+                       showarrow=True, arrowhead=2, font=dict(color="darkred", size=12))
+    return _layout(fig, f"Boxplot of Customer Expenditure in {selected_years_str}", "Total Expenditure (BRL)", None,
+                   yaxis_showticklabels=False)
+
+
+def segmentation_chart(segment_counts, selected_years_str):
+    """Tab 6: number of customers in each purchase frequency segment."""
+    segment_labels = ['Low', 'Medium', 'High', 'Very High']
+    segment_descriptions = ['1 Purchase', '2-3 Purchases', '4-10 Purchases', '> 10 Purchases']
+    fig = go.Figure([go.Bar(
+        x=segment_labels,
+        y=segment_counts,
+        customdata=segment_descriptions,
+        text=[f"{int(count)} Customers" for count in segment_counts],
+        textposition="outside",
+        hovertemplate="%{x} (%{customdata}): %{y:,.0f}<extra></extra>",
+        marker=dict(color=['skyblue', 'orange', 'green', 'red'], line=dict(color="black", width=1)),
+    )])
+    return _layout(fig, f"Customer Segmentation Based on Purchase Frequency in Year(s): {selected_years_str}",
+                   "Customer Segment", "Number of Customers", showlegend=False, bargap=0.2)
@@ -0,0 +1,113 @@
+"""Mergeable quantile sketch for non-negative values such as customer spend.
+
+Values are mapped to logarithmically sized buckets (the DDSketch scheme): with
+relative accuracy ``alpha`` every value ``x`` falls in bucket
+``ceil(log(x) / log(gamma))`` with ``gamma = (1 + alpha) / (1 - alpha)``, and
+any quantile read back from the bucket counts is within ``alpha * x`` of the
+true value. A sketch is just a Series of counts indexed by bucket, so sketches
+of different years or quarters merge by adding their counts.
+"""
+import numpy as np
+import pandas as pd
+
+# Relative accuracy of quantiles read from a sketch (0.5%)
+ALPHA = 0.005
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOG_GAMMA = np.log(GAMMA)
+
+# Values at or below this are counted in a dedicated zero bucket
+MIN_VALUE = 1e-9
+ZERO_BUCKET = np.iinfo(np.int32).min
+
+# Most outlier points drawn on a box plot read from a sketch
+MAX_FLIERS = 200
+
+
+def bucket_index(values):
+    values = np.asarray(values, dtype=float)
+    index = np.full(values.shape, ZERO_BUCKET, dtype=np.int32)
+    positive = values > MIN_VALUE
+    index[positive] = np.ceil(np.log(values[positive]) / LOG_GAMMA).astype(np.int32)
+    return index
+
+
+def bucket_value(index):
+    """Representative value of each bucket, within ``ALPHA`` of every value in it."""
+    index = np.asarray(index)
+    values = 2 * np.power(GAMMA, index.astype(float)) / (GAMMA + 1)
+    return np.where(index == ZERO_BUCKET, 0.0, values)
+
+
+def build_sketch(values):
+    """Return the sketch of ``values`` as bucket counts, ignoring missing values."""
+    values = pd.Series(values).dropna()
+    return pd.Series(bucket_index(values)).value_counts().sort_index().rename("count")
+
+
+def merge_sketches(sketches):
+    sketches = [sketch for sketch in sketches if len(sketch)]
+    if not sketches:
+        return pd.Series(dtype="int64", name="count")
+    return pd.concat(sketches).groupby(level=0).sum().sort_index().rename("count")
+
+
+def sketch_quantiles(sketch, quantiles):
+    """Approximate quantiles (0-1) of the values summarized by ``sketch``."""
+    sketch = sketch.sort_index()
+    cumulative = sketch.to_numpy().cumsum()
+    ranks = np.asarray(quantiles, dtype=float) * (cumulative[-1] - 1)
+    positions = np.searchsorted(cumulative, ranks, side="right")
+    return bucket_value(sketch.index.to_numpy()[positions])
+
+
+def count_quantiles(counts, quantiles):
+    """Quantiles (0-1) of the values counted by ``counts``, a Series of counts indexed by value.
+
+    Exact for value counts of whole numbers such as delivery days, with the
+    same rank convention as ``sketch_quantiles``.
+    """
+    counts = counts[counts > 0].sort_index()
+    cumulative = counts.to_numpy().cumsum()
+    ranks = np.asarray(quantiles, dtype=float) * (cumulative[-1] - 1)
+    positions = np.searchsorted(cumulative, ranks, side="right")
+    return counts.index.to_numpy()[positions]
+
+
+def sketch_boxplot_stats(sketch, whis=1.5, max_fliers=MAX_FLIERS, seed=0):
+    """Box plot statistics in the form expected by ``Axes.bxp``, computed from a sketch.
+
+    Whiskers extend to the most extreme bucket within ``whis`` times the
+    interquartile range, like ``Axes.boxplot`` does for the raw values. The
+    outliers are at most ``max_fliers`` bucket values sampled in proportion to
+    their counts (always including the largest and smallest), so the number of
+    points drawn does not grow with the data. Every statistic is within
+    ``ALPHA`` of the corresponding value of the raw data.
+    """
+    sketch = sketch[sketch > 0].sort_index()
+    q1, med, q3 = sketch_quantiles(sketch, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    values = bucket_value(sketch.index.to_numpy())
+    counts = sketch.to_numpy()
+    within = (values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)
+    inside = values[within]
+    return {
+        "med": med,
+        "q1": q1,
+        "q3": q3,
+        "whislo": inside.min() if len(inside) else q1,
+        "whishi": inside.max() if len(inside) else q3,
+        "fliers": sample_fliers(values[~within], counts[~within], max_fliers, seed),
+    }
+
+
+def sample_fliers(values, counts, max_fliers=MAX_FLIERS, seed=0):
+    """Up to ``max_fliers`` of the outlier values, sampled by count with the extremes kept."""
+    total = int(counts.sum())
+    if total <= max_fliers:
+        return np.repeat(values, counts)
+    if max_fliers < 2:
+        return values[[-1]][:max_fliers]
+    # A fixed seed keeps the drawn chart identical across reruns for the same data
+    rng = np.random.default_rng(seed)
+    sampled = rng.choice(values, size=max_fliers - 2, p=counts / total)
+    return np.sort(np.concatenate([values[[0, -1]], sampled]))
@@ -0,0 +1,152 @@
+"""Optional DuckDB engine for the dashboard's filters and aggregations.
+
+The default engine aggregates the Parquet store with pandas, one chunk at a
+time. With DuckDB installed (``pip install duckdb``) and
+``DASHBOARD_ENGINE=duckdb`` set, the group-bys that build the cube tables
+(``cube.build_cube``), which every filter of the dashboard is served from, run
+as SQL over the Parquet files instead: DuckDB pushes the column selections
+down to the scan, aggregates on every core and spills to disk when an
+aggregation outgrows memory, and only the small aggregates come back as
+DataFrames.
+
+Without DuckDB, or without a Parquet store, everything stays on pandas.
+"""
+import os
+import threading
+
+import data_store
+import quantile_sketch
+from rfm import read_reference_date
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+ENGINE_ENV = "DASHBOARD_ENGINE"
+ENGINES = ("pandas", "duckdb")
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def default_engine():
+    """The engine named by ``DASHBOARD_ENGINE``, "pandas" when unset or when DuckDB is not installed."""
+    engine = os.environ.get(ENGINE_ENV, "pandas").lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown {ENGINE_ENV} {engine!r}, expected one of {', '.join(ENGINES)}")
+    if engine == "duckdb" and duckdb is None:
+        return "pandas"
+    return engine
+
+
+def available(store_path=None):
+    """Whether DuckDB is installed and there is a Parquet store for it to query."""
+    return duckdb is not None and data_store.has_dataset("all_data", store_path)
+
+
+def connect(threads=None, memory_limit=None):
+    """The process-wide DuckDB connection, created on first use.
+
+    ``threads`` defaults to every core; ``memory_limit`` (e.g. "4GB") bounds
+    DuckDB's memory before it spills to its temporary directory.
+    """
+    global _connection
+    if duckdb is None:
+        raise ImportError("The duckdb engine needs the duckdb package: pip install duckdb")
+    with _connection_lock:
+        if _connection is None:
+            _connection = duckdb.connect(database=":memory:")
+            _connection.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+            if memory_limit:
+                _connection.execute("SET memory_limit = ?", [memory_limit])
+        return _connection
+
+
+def _scan(name, store_path=None):
+    # All files of a dataset; year/quarter come from the hive directories and prune the scan
+    root = data_store.dataset_path(name, store_path).as_posix().replace("'", "''")
+    if data_store.is_partitioned(name):
+        return f"read_parquet('{root}/**/*.parquet', hive_partitioning = true)"
+    return f"read_parquet('{root}/*.parquet')"
+
+
+def query(sql, params=None):
+    """Run ``sql`` on a cursor of the shared connection and return the result as a DataFrame."""
+    # A cursor per query, so concurrent sessions do not share one connection's state
+    cursor = connect().cursor()
+    try:
+        return cursor.execute(sql, params or []).df()
+    finally:
+        cursor.close()
+
+
+def order_aggregates(store_path=None):
+    """The ``orders`` and ``delivery`` cube tables, aggregated in SQL."""
+    all_data = _scan("all_data", store_path)
+    orders = query(f"""
+        SELECT year::BIGINT AS year, quarter::BIGINT AS quarter, order_status, customer_state, count(*) AS orders
+        FROM {all_data}
+        GROUP BY ALL
+    """)
+    delivery = query(f"""
+        SELECT year::BIGINT AS year, quarter::BIGINT AS quarter, order_status, customer_state,
+               delivery_time_days, count(*) AS orders
+        FROM {all_data}
+        WHERE delivery_time_days IS NOT NULL
+        GROUP BY ALL
+    """)
+    return orders, delivery
+
+
+def rfm_aggregates(store_path=None):
+    """The ``recency``, ``monetary`` and ``customer_orders`` cube tables, aggregated in SQL."""
+    rfm_data = _scan("rfm_data", store_path)
+    reference_date = read_reference_date(store_path)
+    if reference_date is None:
+        # Older stores carry a precomputed recency column
+        recency = "recency"
+        params = []
+    else:
+        # Whole days, like pandas' Timedelta.days
+        recency = "floor(epoch(?::TIMESTAMP - last_purchase) / 86400)::BIGINT"
+        params = [reference_date.to_pydatetime()]
+    recency_table = query(f"""
+        SELECT year::BIGINT AS year, quarter::BIGINT AS quarter, {recency} AS recency, count(*) AS customers
+        FROM {rfm_data}
+        GROUP BY ALL
+    """, params)
+    # Same buckets as quantile_sketch.bucket_index
+    monetary_table = query(f"""
+        SELECT year::BIGINT AS year, quarter::BIGINT AS quarter,
+               CASE WHEN monetary > {quantile_sketch.MIN_VALUE}
+                    THEN ceil(ln(monetary) / {float(quantile_sketch.LOG_GAMMA)!r})::INTEGER
+                    ELSE {quantile_sketch.ZERO_BUCKET} END AS bucket,
+               count(*) AS customers
+        FROM {rfm_data}
+        GROUP BY ALL
+    """)
+    # Customers numbered densely, like pd.factorize; the ids are kept for the cube's customer codes
+    customer_orders = query(f"""
+        SELECT year, quarter, customer_unique_id,
+               (dense_rank() OVER (ORDER BY customer_unique_id) - 1) AS customer, frequency AS orders
+        FROM {rfm_data}
+    """)
+    return recency_table, monetary_table, customer_orders
+
+
+def drilldown_aggregates(drilldown_keys, store_path=None):
+    """Order rows and item revenue per customer state and the key column of each tab5 drill-down table.
+
+    ``drilldown_keys`` maps table names to the all_data column they are
+    aggregated on; ``cube.drilldown_details`` joins the seller and category details.
+    """
+    all_data = _scan("all_data", store_path)
+    tables = {}
+    for table, key in drilldown_keys.items():
+        tables[table] = query(f"""
+            SELECT customer_state, {key}, count(*) AS orders, sum(price) AS revenue
+            FROM {all_data}
+            GROUP BY customer_state, {key}
+        """)
+    return tables
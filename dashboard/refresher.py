@@ -0,0 +1,149 @@
+"""Background refresh of the data the dashboard serves, without restarting the app.
+
+The dashboard serves everything from one ``Snapshot``: the read-only cube and
+the data version it was built from. A ``DataRefresher`` thread polls the data
+version of the store every ``DASHBOARD_REFRESH_SECONDS`` (60 by default, 0 to
+never poll). When it changes and has stayed the same for one more poll, so a
+pipeline run still writing partitions is not picked up halfway, the refresher
+builds the next snapshot off the request path:
+
+* rebuilds and stores the cube if it is older than ``all_data``/``rfm_data``
+* reads and freezes the cube tables
+* splits the drill-down tables into per-state slices
+
+and only then swaps it in with a single assignment. Reruns started before the
+swap finish on the old snapshot; later ones see the new version, which is part
+of every cache key downstream (rendered charts, map HTML), so nothing
+computed from the old data is served again. A failed build keeps the
+old snapshot in place.
+"""
+import os
+import threading
+import time
+import warnings
+
+import cube
+import data_store
+from shared_data import freeze
+
+REFRESH_ENV = "DASHBOARD_REFRESH_SECONDS"
+DEFAULT_REFRESH_SECONDS = 60
+
+
+def default_interval():
+    """Seconds between polls of the data version from ``DASHBOARD_REFRESH_SECONDS``, 0 to never poll."""
+    return float(os.environ.get(REFRESH_ENV, DEFAULT_REFRESH_SECONDS))
+
+
+class Snapshot:
+    """Read-only data of one data version, shared by every session while it is current."""
+
+    def __init__(self, version, generation, data_cube, drilldown):
+        self.version = version
+        # Counts the snapshots loaded by this process, starting at 1
+        self.generation = generation
+        self.cube = data_cube
+        # The tab5 drill-down tables split by customer state (cube.drilldown_index)
+        self.drilldown = drilldown
+        self.loaded_at = time.time()
+
+
+def cube_is_stale(store_path=None):
+    """Whether a stored cube is older than the datasets it is aggregated from."""
+    if not data_store.has_dataset("cube", store_path):
+        return False
+    return (data_store.data_version(["all_data", "rfm_data"], store_path)
+            > data_store.data_version(["cube"], store_path))
+
+
+def load_snapshot(generation, store_path=None):
+    """Load and pre-aggregate everything a rerun reads into a new ``Snapshot``."""
+    if cube_is_stale(store_path):
+        cube.write_cube(cube.build_cube(store_path), store_path)
+    # Read the version after the cube is written, so the rebuilt cube does not look like another change
+    version = data_store.data_version(store_path=store_path)
+    data_cube = {table: freeze(frame) for table, frame in cube.read_cube(store_path).items()}
+    drilldown = {table: {state: freeze(rows) for state, rows in states.items()}
+                 for table, states in cube.drilldown_index(data_cube).items()}
+    return Snapshot(version, generation, data_cube, drilldown)
+
+
+class DataRefresher:
+    """Keeps the current ``Snapshot`` and replaces it in a background thread when the data changes.
+
+    ``on_swap(snapshot)`` is called after each new snapshot is swapped in, e.g.
+    to drop the cached charts of older versions.
+    """
+
+    def __init__(self, store_path=None, interval=None, on_swap=None):
+        self.store_path = store_path
+        self.interval = default_interval() if interval is None else interval
+        self.on_swap = on_swap
+        self.last_error = None
+        self._current = None
+        self._seen_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        """The snapshot to serve, loaded in the caller on first use."""
+        snapshot = self._current
+        if snapshot is None:
+            with self._lock:
+                if self._current is None:
+                    self._swap(load_snapshot(1, self.store_path))
+                snapshot = self._current
+        return snapshot
+
+    def _swap(self, snapshot):
+        # Replacing the reference is atomic, readers hold on to whichever snapshot they got
+        self._current = snapshot
+        self._seen_version = snapshot.version
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+
+    def refresh(self, force=False):
+        """Check the data version once and swap in a new snapshot if it changed and settled.
+
+        Returns whether a new snapshot was swapped in. ``force`` loads it
+        without waiting for the version to settle.
+        """
+        current = self.current()
+        version = data_store.data_version(store_path=self.store_path)
+        if version == current.version:
+            self._seen_version = version
+            return False
+        if not force and version != self._seen_version:
+            # Changed since the last poll: wait one more interval for the writer to finish
+            self._seen_version = version
+            return False
+
+        with self._lock:
+            try:
+                snapshot = load_snapshot(current.generation + 1, self.store_path)
+            except Exception as error:  # keep serving the old snapshot
+                self.last_error = error
+                warnings.warn(f"Data refresh failed, still serving version {current.version}: {error!r}")
+                return False
+            self.last_error = None
+            self._swap(snapshot)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        """Load the first snapshot and start polling in a daemon thread (unless the interval is 0)."""
+        self.current()
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="data-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,216 @@
+"""Headless export of the dashboard analyses, for scheduled reports.
+
+Writes the chart and the aggregate table of every tab for a standard set of
+filter combinations to disk, without a Streamlit session or a browser:
+
+    python report.py --output reports [--views tab1 tab6] [--years 2017 2018] [--workers 8] [--format svg]
+
+The tables come from the same cube functions the dashboard tabs call, and the
+charts from the same builders in ``figures.py``. The charts of all
+combinations are submitted to a ``RenderService`` at once, so they render in
+parallel on every worker process while the tables are written. The standard
+combinations are
+
+* tab1: all order statuses together and each status on its own
+* tab2: all customers
+* tab3: every year and quarter, every year, and all years
+* tab4 / tab6: every year and all years
+* tab5: all orders, written as the map HTML
+
+Combinations without data are skipped, like the dashboard shows a warning
+instead of a chart. ``report.json`` in the output directory lists every file
+written with its filters, the data version and the tab1 summary statistics.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+
+import cube
+import data_store
+import figures
+from geo import render_purchase_map
+from quantile_sketch import ALPHA as SKETCH_ALPHA, sketch_boxplot_stats
+from refresher import load_snapshot
+
+VIEWS = ("tab1", "tab2", "tab3", "tab4", "tab5", "tab6")
+QUARTERS = [1, 2, 3, 4]
+
+
+def default_workers():
+    """One render process per core; on a single core rendering in-process is faster."""
+    cores = os.cpu_count() or 1
+    return cores if cores > 1 else 0
+
+
+def _report(view, name, filters, table, chart=None, summary=None):
+    # chart is (builder, args) for figures.RenderService
+    return {"view": view, "name": name, "filters": filters, "table": table, "chart": chart, "summary": summary}
+
+
+def _year_selections(years):
+    # Every year on its own, then all of them together
+    selections = [(str(year), [year]) for year in years]
+    if len(years) > 1:
+        selections.append(("all_years", list(years)))
+    return selections
+
+
+def delivery_reports(data_cube):
+    edges = cube.delivery_bin_edges(data_cube)
+    statuses = cube.order_statuses(data_cube)
+    for name, selection in [("all_statuses", statuses)] + [(f"status_{status}", [status]) for status in statuses]:
+        counts = cube.delivery_counts(data_cube, selection)
+        if counts.sum() == 0:
+            continue
+        bins = cube.delivery_histogram(counts, edges)
+        table = pd.DataFrame({"from_days": edges[:-1], "to_days": edges[1:], "orders": bins})
+        summary = {key: float(value) for key, value in cube.delivery_summary(counts).items()}
+        yield _report("tab1", name, {"order_status": selection}, table,
+                      (figures.delivery_histogram, (bins, edges)), summary)
+
+
+def recency_reports(data_cube):
+    counts = cube.recency_counts(data_cube)
+    yield _report("tab2", "all_customers", {}, counts.rename("customers").reset_index(),
+                  (figures.recency_histogram, (counts,)))
+
+
+def frequency_reports(data_cube, years):
+    selections = [(f"{year}_q{quarter}", [year], [quarter]) for year in years for quarter in QUARTERS]
+    selections += [(f"{name}_all_quarters", selected, QUARTERS) for name, selected in _year_selections(years)]
+    for name, selected_years, selected_quarters in selections:
+        counts = cube.frequency_counts(data_cube, selected_years, selected_quarters)
+        if counts.sum() == 0:
+            continue
+        years_str = ', '.join(map(str, selected_years))
+        quarters_str = ', '.join(map(str, selected_quarters))
+        yield _report("tab3", name, {"years": selected_years, "quarters": selected_quarters},
+                      counts.reset_index(), (figures.frequency_histogram, (counts, years_str, quarters_str)))
+
+
+def expenditure_reports(data_cube, years):
+    for name, selected_years in _year_selections(years):
+        sketch = cube.monetary_sketch(data_cube, selected_years)
+        if sketch.sum() == 0:
+            continue
+        box_stats = sketch_boxplot_stats(sketch)
+        table = pd.DataFrame([{key: value for key, value in box_stats.items() if key != "fliers"}])
+        table["customers"] = int(sketch.sum())
+        table["relative_error"] = SKETCH_ALPHA
+        yield _report("tab4", name, {"years": selected_years}, table,
+                      (figures.expenditure_boxplot, (box_stats, ', '.join(map(str, selected_years)), SKETCH_ALPHA)))
+
+
+def state_reports(data_cube):
+    # The map is HTML rather than an image, it is rendered in write_reports
+    yield _report("tab5", "all_orders", {}, cube.state_purchases(data_cube))
+
+
+def segmentation_reports(data_cube, years):
+    for name, selected_years in _year_selections(years):
+        counts = cube.frequency_counts(data_cube, selected_years)
+        if counts.sum() == 0:
+            continue
+        segment_counts = cube.segment_counts(counts)
+        table = pd.DataFrame({
+            "segment": [segment for segment, _, _ in cube.SEGMENTS],
+            "fewest_purchases": [fewest for _, fewest, _ in cube.SEGMENTS],
+            "most_purchases": pd.array([most for _, _, most in cube.SEGMENTS], dtype="Int64"),
+            "customers": segment_counts,
+        })
+        yield _report("tab6", name, {"years": selected_years}, table,
+                      (figures.segmentation_chart, (segment_counts, ', '.join(map(str, selected_years)))))
+
+
+def build_reports(data_cube, views=VIEWS, years=None):
+    """The reports of the standard filter combinations of ``views``, restricted to ``years`` if given."""
+    available_years = cube.cube_years(data_cube)
+    years = available_years if years is None else [year for year in available_years if year in years]
+    builders = {
+        "tab1": lambda: delivery_reports(data_cube),
+        "tab2": lambda: recency_reports(data_cube),
+        "tab3": lambda: frequency_reports(data_cube, years),
+        "tab4": lambda: expenditure_reports(data_cube, years),
+        "tab5": lambda: state_reports(data_cube),
+        "tab6": lambda: segmentation_reports(data_cube, years),
+    }
+    return [report for view in views for report in builders[view]()]
+
+
+def write_reports(reports, output, version, workers=None, image_format="png"):
+    """Write the table and chart of every report under ``output`` and return the manifest."""
+    output = Path(output)
+    # Every chart is written once, so the service keeps no images
+    service = figures.RenderService(figures.FigureCache(max_entries=0),
+                                    default_workers() if workers is None else workers)
+    try:
+        # Queue every chart first, the workers render them while the tables are written
+        futures = []
+        for report in reports:
+            if report["chart"] is None:
+                futures.append(None)
+                continue
+            builder, args = report["chart"]
+            futures.append(service.submit((report["view"], report["name"], version), builder, *args,
+                                          image_format=image_format))
+
+        manifest = []
+        for report in reports:
+            directory = output / report["view"]
+            directory.mkdir(parents=True, exist_ok=True)
+            table_path = directory / f"{report['name']}.csv"
+            report["table"].to_csv(table_path, index=False)
+            manifest.append({"view": report["view"], "name": report["name"], "filters": report["filters"],
+                             "table": table_path.relative_to(output).as_posix(), "summary": report["summary"]})
+
+        for report, entry, future in zip(reports, manifest, futures):
+            if report["view"] == "tab5":
+                chart_path = output / report["view"] / f"{report['name']}.html"
+                chart_path.write_text(render_purchase_map(report["table"]), encoding="utf-8")
+            elif future is not None:
+                try:
+                    image = future.result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory), draw this chart here instead
+                    builder, args = report["chart"]
+                    image = figures.render_chart(builder, args, image_format)
+                chart_path = output / report["view"] / f"{report['name']}.{image_format}"
+                chart_path.write_bytes(image)
+            else:
+                continue
+            entry["chart"] = chart_path.relative_to(output).as_posix()
+    finally:
+        service.shutdown()
+
+    manifest = {"data_version": version, "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "reports": manifest}
+    (output / "report.json").write_text(json.dumps(manifest, indent=2, default=str))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the charts and tables of the dashboard tabs to disk.")
+    parser.add_argument("--output", type=Path, default=Path("reports"), help="Directory to write the reports to")
+    parser.add_argument("--store", type=Path, default=data_store.STORE_PATH, help="Parquet store directory")
+    parser.add_argument("--views", nargs="+", choices=VIEWS, default=list(VIEWS), help="Tabs to export")
+    parser.add_argument("--years", type=int, nargs="+", help="Years to export (default: every year in the data)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Render processes (default: one per core, 0 to render in-process)")
+    parser.add_argument("--format", choices=["png", "svg"], default="png", help="Chart image format")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(1, args.store)
+    reports = build_reports(snapshot.cube, args.views, args.years)
+    manifest = write_reports(reports, args.output, snapshot.version, args.workers, args.format)
+    for entry in manifest["reports"]:
+        print(f"{entry['view']} {entry['name']}: {entry['table']}, {entry.get('chart', '-')}")
+    print(f"{len(manifest['reports'])} reports -> {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
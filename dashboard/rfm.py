@@ -0,0 +1,120 @@
+"""Incremental RFM (recency, frequency, monetary) engine.
+
+``rfm_data`` is kept in the Parquet store as per-customer, per-quarter running
+aggregates: the last purchase date, the order count and the spend sum. A new
+batch of orders is reduced to the same aggregates and merged into only the
+year/quarter partitions it touches, so an update costs time proportional to
+the batch (and the quarters it falls in) rather than to the full history.
+
+``recency`` depends on the most recent purchase in the whole dataset, which
+moves with every batch. It is therefore not stored per row but derived at read
+time from ``last_purchase`` and the reference date kept next to the dataset.
+"""
+import json
+
+import pandas as pd
+
+import data_store
+
+RFM_KEYS = ["customer_unique_id", "year", "quarter"]
+RFM_COLUMNS = ["customer_unique_id", "recency", "frequency", "monetary", "year", "quarter"]
+REFERENCE_FILE = "_reference_date.json"
+
+
+def rfm_partials(orders):
+    """Reduce a batch of joined order rows to per-customer, per-quarter aggregates."""
+    timestamps = orders["order_purchase_timestamp"]
+    frame = pd.DataFrame({
+        "customer_unique_id": orders["customer_unique_id"],
+        "year": timestamps.dt.year,
+        "quarter": timestamps.dt.quarter,
+        "order_id": orders["order_id"],
+        "order_purchase_timestamp": timestamps,
+        "price": orders["price"],
+    })
+    return frame.groupby(RFM_KEYS, observed=True).agg(
+        last_purchase=("order_purchase_timestamp", "max"),
+        frequency=("order_id", "nunique"),
+        monetary=("price", "sum"),
+    ).reset_index()
+
+
+def merge_partials(partials):
+    """Combine aggregates of disjoint order batches for the same customers and quarters."""
+    partials = pd.concat(partials, ignore_index=True)
+    # Batches never share an order, so distinct order counts can simply be summed
+    return partials.groupby(RFM_KEYS).agg(
+        last_purchase=("last_purchase", "max"),
+        frequency=("frequency", "sum"),
+        monetary=("monetary", "sum"),
+    ).reset_index()
+
+
+def add_recency(rfm, reference_date):
+    rfm["recency"] = (reference_date - rfm["last_purchase"]).dt.days
+    return rfm
+
+
+def read_reference_date(store_path=None):
+    reference_file = data_store.dataset_path("rfm_data", store_path) / REFERENCE_FILE
+    if not reference_file.exists():
+        return None
+    with open(reference_file, "r") as f:
+        return pd.Timestamp(json.load(f)["reference_date"])
+
+
+def write_reference_date(reference_date, store_path=None):
+    reference_file = data_store.dataset_path("rfm_data", store_path) / REFERENCE_FILE
+    with open(reference_file, "w") as f:
+        json.dump({"reference_date": reference_date.isoformat()}, f)
+
+
+def write_rfm(rfm, store_path=None):
+    """Replace the whole rfm_data store with the running aggregates in ``rfm``."""
+    data_store.write_dataset([rfm.drop(columns="recency", errors="ignore")], "rfm_data", store_path=store_path)
+    write_reference_date(rfm["last_purchase"].max(), store_path)
+
+
+def update_rfm(orders, store_path=None):
+    """Merge a batch of new (previously unseen) joined order rows into the rfm_data store.
+
+    Only the year/quarter partitions the batch falls into are read and
+    rewritten. Returns the number of customer rows in the touched partitions.
+    """
+    delta = rfm_partials(orders)
+    if delta.empty:
+        return 0
+    touched = delta[["year", "quarter"]].drop_duplicates()
+
+    if data_store.has_dataset("rfm_data", store_path):
+        existing = data_store.read_dataset(
+            "rfm_data", columns=RFM_KEYS + ["last_purchase", "frequency", "monetary"],
+            years=touched["year"].unique(), quarters=touched["quarter"].unique(), store_path=store_path)
+        merged = merge_partials([existing, delta])
+        reference_date = read_reference_date(store_path)
+    else:
+        merged = merge_partials([delta])
+        reference_date = None
+
+    # Keep the exact (year, quarter) pairs of the batch, the year x quarter read above may include more
+    merged = merged.merge(touched, on=["year", "quarter"])
+    data_store.write_partitions(merged, "rfm_data", store_path=store_path)
+
+    batch_latest = delta["last_purchase"].max()
+    write_reference_date(batch_latest if reference_date is None else max(reference_date, batch_latest), store_path)
+    return len(merged)
+
+
+def read_rfm(columns=None, years=None, quarters=None, store_path=None):
+    """Read rfm_data, deriving ``recency`` from the stored running aggregates when needed."""
+    columns = list(columns) if columns is not None else RFM_COLUMNS
+    reference_date = read_reference_date(store_path) if data_store.has_dataset("rfm_data", store_path) else None
+    if reference_date is None or "recency" not in columns:
+        # The CSV fallback (and older stores) carry a precomputed recency column
+        return data_store.read_dataset("rfm_data", columns=columns, years=years, quarters=quarters,
+                                       store_path=store_path)
+
+    read_columns = [column for column in columns if column not in ("recency", "last_purchase")] + ["last_purchase"]
+    rfm = data_store.read_dataset("rfm_data", columns=read_columns, years=years, quarters=quarters,
+                                  store_path=store_path)
+    return add_recency(rfm, reference_date)[columns]
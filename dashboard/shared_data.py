@@ -0,0 +1,18 @@
+"""Read-only data shared by every session of the dashboard process.
+
+The cube tables of a data snapshot are held once per server process and read
+by every session. ``freeze`` makes the arrays behind them read-only before
+they are shared, so a session cannot modify another session's data in place.
+"""
+import numpy as np
+
+
+def freeze(frame):
+    """Mark the arrays behind a DataFrame read-only, so in-place writes fail instead of leaking across sessions."""
+    # The block arrays hold the data itself; the arrays of a column (to_numpy, .values) are views of
+    # them, and marking a view read-only leaves the block and frame.loc writes unprotected
+    for block in frame._mgr.blocks:
+        # Only numpy blocks: pandas string arrays rewrite their buffer when sliced, so it must stay writeable
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+    return frame
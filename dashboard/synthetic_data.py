@@ -0,0 +1,242 @@
+"""Seeded generator of synthetic raw Olist tables for scale testing.
+
+Writes schema-compatible ``olist_orders_dataset.csv``,
+``olist_order_items_dataset.csv``, ``olist_customers_dataset.csv``,
+``olist_order_payments_dataset.csv`` and ``olist_order_reviews_dataset.csv``
+that ``pipeline.py`` can turn into ``all_data``/``rfm_data``::
+
+    python dashboard/synthetic_data.py --orders 10000000 --output /tmp/olist
+
+Orders are generated and appended to the CSV files one chunk at a time with
+vectorized NumPy code, so memory stays bounded by the chunk size at any scale.
+Customer states follow Olist's regional distribution over the ``sigla`` codes
+of ``map/brazil-states.geojson``, purchase timestamps span September 2016 to
+October 2018 with the dataset's growth over time, and items reference the
+product and seller ids of the real reference tables in ``data/`` when present.
+Those reference tables are copied next to the generated ones, so the output
+directory can be passed straight to ``pipeline.py --source``.
+"""
+import argparse
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+RAW_DATA_PATH = Path(__file__).parent.parent / "data"
+CHUNK_SIZE = 1_000_000
+REFERENCE_TABLES = ["olist_products_dataset", "olist_sellers_dataset", "product_category_name_translation"]
+
+# Customer state share (%) in the public Olist dataset
+STATE_WEIGHTS = {
+    "SP": 41.98, "RJ": 12.92, "MG": 11.70, "RS": 5.50, "PR": 5.07, "SC": 3.66, "BA": 3.40, "DF": 2.15,
+    "ES": 2.04, "GO": 2.03, "PE": 1.66, "CE": 1.34, "PA": 0.98, "MT": 0.91, "MA": 0.75, "MS": 0.72,
+    "PB": 0.54, "PI": 0.50, "RN": 0.49, "AL": 0.42, "SE": 0.35, "TO": 0.28, "RO": 0.25, "AM": 0.15,
+    "AC": 0.08, "AP": 0.07, "RR": 0.05,
+}
+STATES = np.array(list(STATE_WEIGHTS))
+STATE_CUMULATIVE = np.cumsum(list(STATE_WEIGHTS.values())) / sum(STATE_WEIGHTS.values())
+
+# Capital and the first digit of the zip codes of each state, used for customer addresses
+STATE_CAPITALS = {
+    "SP": ("sao paulo", 1), "RJ": ("rio de janeiro", 2), "MG": ("belo horizonte", 3), "RS": ("porto alegre", 9),
+    "PR": ("curitiba", 8), "SC": ("florianopolis", 8), "BA": ("salvador", 4), "DF": ("brasilia", 7),
+    "ES": ("vitoria", 2), "GO": ("goiania", 7), "PE": ("recife", 5), "CE": ("fortaleza", 6),
+    "PA": ("belem", 6), "MT": ("cuiaba", 7), "MA": ("sao luis", 6), "MS": ("campo grande", 7),
+    "PB": ("joao pessoa", 5), "PI": ("teresina", 6), "RN": ("natal", 5), "AL": ("maceio", 5),
+    "SE": ("aracaju", 4), "TO": ("palmas", 7), "RO": ("porto velho", 7), "AM": ("manaus", 6),
+    "AC": ("rio branco", 6), "AP": ("macapa", 6), "RR": ("boa vista", 6),
+}
+CAPITALS = np.array([STATE_CAPITALS[state][0] for state in STATES])
+ZIP_DIGITS = np.array([STATE_CAPITALS[state][1] for state in STATES])
+
+ORDER_STATUSES = {
+    "delivered": 97.02, "shipped": 1.11, "canceled": 0.63, "unavailable": 0.61, "invoiced": 0.32,
+    "processing": 0.30, "created": 0.005, "approved": 0.005,
+}
+PAYMENT_TYPES = {"credit_card": 73.9, "boleto": 19.0, "voucher": 5.6, "debit_card": 1.5}
+REVIEW_SCORES = {5: 57.8, 4: 19.3, 3: 8.2, 2: 3.2, 1: 11.5}
+ITEMS_PER_ORDER = {1: 90.1, 2: 7.6, 3: 1.4, 4: 0.5, 5: 0.2, 6: 0.2}
+
+PURCHASE_START = pd.Timestamp("2016-09-04")
+PURCHASE_END = pd.Timestamp("2018-10-17")
+
+# Share of orders placed by a returning customer
+REPEAT_RATE = 0.03
+
+
+def _choice(rng, weights, size):
+    values = np.array(list(weights))
+    probabilities = np.array(list(weights.values()), dtype=float)
+    return rng.choice(values, size, p=probabilities / probabilities.sum())
+
+
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def _hex_ids(prefix, numbers):
+    # 32-character ids like Olist's, deterministic in the row number. The characters are written
+    # into one byte matrix and wrapped as an Arrow string array, instead of formatting every number
+    numbers = np.asarray(numbers, dtype=np.uint64)
+    chars = np.empty((len(numbers), 32), dtype=np.uint8)
+    chars[:, :16] = np.frombuffer(f"{prefix:0<16}".encode(), dtype=np.uint8)
+    chars[:, 16:] = HEX_DIGITS[(numbers[:, None] >> np.arange(60, -1, -4, dtype=np.uint64)) & np.uint64(15)]
+    offsets = np.arange(0, 32 * (len(numbers) + 1), 32, dtype=np.int32)
+    ids = pa.StringArray.from_buffers(len(numbers), pa.py_buffer(offsets), pa.py_buffer(chars))
+    return pd.Series(ids, dtype=pd.StringDtype("pyarrow"))
+
+
+def _uniform_hash(numbers):
+    # A fixed pseudo-random value in [0, 1) per number, so a customer keeps its state across chunks
+    return ((np.asarray(numbers, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)) / 2 ** 32
+
+
+def _seconds(values):
+    return pd.to_timedelta(values, unit="s")
+
+
+def load_reference_ids(source_path=RAW_DATA_PATH):
+    """Product and seller ids from the shipped reference tables, or synthetic ones."""
+    products_file = Path(source_path) / "olist_products_dataset.csv"
+    sellers_file = Path(source_path) / "olist_sellers_dataset.csv"
+    if products_file.exists():
+        products = pd.read_csv(products_file, usecols=["product_id"])["product_id"].to_numpy()
+    else:
+        products = _hex_ids("p0", np.arange(32_951)).to_numpy()
+    if sellers_file.exists():
+        sellers = pd.read_csv(sellers_file, usecols=["seller_id"])["seller_id"].to_numpy()
+    else:
+        sellers = _hex_ids("s0", np.arange(3_095)).to_numpy()
+    return products, sellers
+
+
+def generate_chunk(start, stop, products, sellers, seed=0):
+    """Generate the raw tables for orders ``start`` to ``stop`` (exclusive)."""
+    rng = np.random.default_rng([seed, start])
+    size = stop - start
+    order_numbers = np.arange(start, stop)
+
+    # Customers: a new customer_id per order; returning customers reuse an earlier unique id
+    returning = (rng.random(size) < REPEAT_RATE) & (order_numbers > 0)
+    unique_numbers = np.where(returning, (rng.random(size) * np.maximum(order_numbers, 1)).astype(np.int64),
+                              order_numbers)
+    state_index = np.searchsorted(STATE_CUMULATIVE, _uniform_hash(unique_numbers), side="right")
+    state_index = np.minimum(state_index, len(STATES) - 1)
+    zip_prefix = ZIP_DIGITS[state_index] * 10000 + (_uniform_hash(unique_numbers + 7) * 10000).astype(np.int64)
+    customer_ids = _hex_ids("c0", order_numbers)
+    customers = pd.DataFrame({
+        "customer_id": customer_ids,
+        "customer_unique_id": _hex_ids("u0", unique_numbers),
+        "customer_zip_code_prefix": pd.Series(zip_prefix).astype(str).str.zfill(5),
+        "customer_city": CAPITALS[state_index],
+        "customer_state": STATES[state_index],
+    })
+
+    # Orders: purchase volume grows over time (density rising linearly from start to end)
+    span = (PURCHASE_END - PURCHASE_START).total_seconds()
+    purchase = PURCHASE_START + _seconds(np.sqrt(rng.random(size)) * span)
+    purchase = purchase.floor("s")
+    status = _choice(rng, ORDER_STATUSES, size)
+    approved = purchase + _seconds(rng.gamma(1.5, 6 * 3600, size)).floor("s")
+    carrier = approved + _seconds(rng.gamma(2.0, 1.4 * 86400, size)).floor("s")
+    delivered = carrier + _seconds(rng.gamma(3.0, 3.0 * 86400, size)).floor("s")
+    estimated = (purchase + _seconds(rng.normal(24, 6, size).clip(7, 60) * 86400)).normalize()
+    order_ids = _hex_ids("o0", order_numbers)
+    orders = pd.DataFrame({
+        "order_id": order_ids,
+        "customer_id": customer_ids,
+        "order_status": status,
+        "order_purchase_timestamp": purchase,
+        "order_approved_at": pd.Series(approved).where(status != "created"),
+        "order_delivered_carrier_date": pd.Series(carrier).where(np.isin(status, ["delivered", "shipped"])),
+        "order_delivered_customer_date": pd.Series(delivered).where(status == "delivered"),
+        "order_estimated_delivery_date": estimated,
+    })
+
+    # Items: one row per item, priced from a log-normal like Olist's
+    items_per_order = _choice(rng, ITEMS_PER_ORDER, size).astype(np.int64)
+    item_orders = np.repeat(np.arange(size), items_per_order)
+    first_item = np.repeat(np.cumsum(items_per_order) - items_per_order, items_per_order)
+    item_count = len(item_orders)
+    price = np.round(rng.lognormal(4.4, 0.9, item_count), 2)
+    freight = np.round(rng.gamma(2.5, 8.0, item_count), 2)
+    items = pd.DataFrame({
+        "order_id": order_ids.iloc[item_orders].to_numpy(),
+        "order_item_id": np.arange(item_count) - first_item + 1,
+        "product_id": products[rng.integers(0, len(products), item_count)],
+        "seller_id": sellers[rng.integers(0, len(sellers), item_count)],
+        "shipping_limit_date": (purchase[item_orders] + pd.Timedelta(days=6)),
+        "price": price,
+        "freight_value": freight,
+    })
+
+    # Payments: a single payment covering the order's items and freight
+    order_value = np.bincount(item_orders, weights=price + freight, minlength=size)
+    payment_type = _choice(rng, PAYMENT_TYPES, size)
+    payments = pd.DataFrame({
+        "order_id": order_ids,
+        "payment_sequential": 1,
+        "payment_type": payment_type,
+        "payment_installments": np.where(payment_type == "credit_card", rng.integers(1, 11, size), 1),
+        "payment_value": np.round(order_value, 2),
+    })
+
+    # Reviews: one per order, created the day after delivery (or the estimate)
+    review_created = pd.Series(delivered).where(status == "delivered", estimated).dt.normalize() + pd.Timedelta(days=1)
+    reviews = pd.DataFrame({
+        "review_id": _hex_ids("r0", order_numbers),
+        "order_id": order_ids,
+        "review_score": _choice(rng, REVIEW_SCORES, size),
+        "review_comment_title": "",
+        "review_comment_message": "",
+        "review_creation_date": review_created,
+        "review_answer_timestamp": review_created + _seconds(rng.gamma(1.5, 86400, size)).floor("s"),
+    })
+
+    return {
+        "olist_customers_dataset": customers,
+        "olist_orders_dataset": orders,
+        "olist_order_items_dataset": items,
+        "olist_order_payments_dataset": payments,
+        "olist_order_reviews_dataset": reviews,
+    }
+
+
+def generate(orders, output_path, seed=0, chunk_size=CHUNK_SIZE, source_path=RAW_DATA_PATH):
+    """Write ``orders`` synthetic orders and their related rows to CSV files, chunk by chunk."""
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    products, sellers = load_reference_ids(source_path)
+
+    rows = {}
+    for start in range(0, orders, chunk_size):
+        tables = generate_chunk(start, min(start + chunk_size, orders), products, sellers, seed)
+        for name, frame in tables.items():
+            frame.to_csv(output_path / f"{name}.csv", mode="w" if start == 0 else "a", header=start == 0,
+                         index=False)
+            rows[name] = rows.get(name, 0) + len(frame)
+
+    # The pipeline joins the generated orders with the product and seller reference tables
+    for name in REFERENCE_TABLES:
+        reference_file = Path(source_path) / f"{name}.csv"
+        if reference_file.exists() and reference_file.resolve() != (output_path / f"{name}.csv").resolve():
+            shutil.copyfile(reference_file, output_path / f"{name}.csv")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw Olist tables for scale testing.")
+    parser.add_argument("--orders", type=int, default=100_000, help="Number of orders to generate")
+    parser.add_argument("--output", type=Path, required=True, help="Directory to write the CSV files to")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Orders generated per chunk")
+    args = parser.parse_args()
+
+    rows = generate(args.orders, args.output, seed=args.seed, chunk_size=args.chunk_size)
+    for name, count in rows.items():
+        print(f"{name}: {count} rows -> {args.output / f'{name}.csv'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Shared fixtures: small synthetic Olist stores built by the real pipeline.
+
+The dashboard modules import each other as top-level modules, so ``dashboard/``
+is put on the import path like ``streamlit run dashboard.py`` does.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+DASHBOARD_PATH = Path(__file__).parent.parent / "dashboard"
+sys.path.insert(0, str(DASHBOARD_PATH))
+
+import pipeline  # noqa: E402
+import synthetic_data  # noqa: E402
+
+# Orders of the synthetic store, and of the batch appended to it in the incremental tests
+ORDERS = 3000
+BATCH_ORDERS = 600
+
+
+def write_tables(tables, path):
+    path.mkdir(parents=True, exist_ok=True)
+    for name, frame in tables.items():
+        frame.to_csv(path / f"{name}.csv", index=False)
+
+
+@pytest.fixture(scope="session")
+def synthetic_store(tmp_path_factory):
+    """A Parquet store built by the pipeline from ``ORDERS`` synthetic orders."""
+    root = tmp_path_factory.mktemp("synthetic")
+    synthetic_data.generate(ORDERS, root / "raw")
+    pipeline.run(root / "raw", root / "store")
+    return root / "store"
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import cube
+from rfm import read_rfm
+
+PERIODS = [
+    ([2017], None),
+    ([2018], [3]),
+    ([2017, 2018], [1, 4]),
+    ([2016, 2017, 2018], None),
+]
+
+
+@pytest.fixture(scope="module")
+def cube_and_rfm(synthetic_store):
+    return cube.read_cube(synthetic_store), read_rfm(store_path=synthetic_store)
+
+
+def _direct_frequency(rfm, years, quarters):
+    """Customers per number of orders in the selected periods, grouped straight from rfm_data."""
+    selected = rfm[rfm["year"].isin(years) & (rfm["quarter"].isin(quarters) if quarters else True)]
+    per_customer = selected.groupby("customer_unique_id")["frequency"].sum()
+    return per_customer.value_counts().sort_index()
+
+
+@pytest.mark.parametrize("years, quarters", PERIODS)
+def test_frequency_counts_match_a_direct_groupby(cube_and_rfm, years, quarters):
+    data_cube, rfm = cube_and_rfm
+    counts = cube.frequency_counts(data_cube, years, quarters)
+    expected = _direct_frequency(rfm, years, quarters)
+    assert counts.sum() > 0
+    assert counts.to_dict() == expected.to_dict()
+
+
+@pytest.mark.parametrize("years, quarters", PERIODS)
+def test_segment_counts_match_a_direct_groupby(cube_and_rfm, years, quarters):
+    data_cube, rfm = cube_and_rfm
+    per_customer = _direct_frequency(rfm, years, quarters)
+    frequency = per_customer.index.to_series()
+    expected = [int(per_customer[(frequency >= fewest) & ((frequency <= most) if most else True)].sum())
+                for _, fewest, most in cube.SEGMENTS]
+    assert cube.segment_counts(cube.frequency_counts(data_cube, years, quarters)) == expected
+
+
+def test_frequency_counts_of_no_period_are_empty(cube_and_rfm):
+    data_cube, _ = cube_and_rfm
+    assert cube.frequency_counts(data_cube, [1999]).empty
+    assert cube.segment_counts(pd.Series(dtype="int64")) == [0] * len(cube.SEGMENTS)
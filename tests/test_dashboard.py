@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import data_store
+import pipeline
+import synthetic_data
+from conftest import DASHBOARD_PATH
+
+APP_PATH = DASHBOARD_PATH / "dashboard.py"
+VIEWS = ["tab1", "tab2", "tab3", "tab4", "tab5", "tab6"]
+
+# Columns of an all_data.csv written before the pipeline added the order items
+ORDER_COLUMNS = ["order_id", "customer_unique_id", "order_status", "order_purchase_timestamp",
+                 "delivery_time_days", "customer_state"]
+
+
+@pytest.fixture(scope="module")
+def csv_files(tmp_path_factory):
+    """all_data.csv and rfm_data.csv written by the pipeline from synthetic orders."""
+    root = tmp_path_factory.mktemp("csv")
+    synthetic_data.generate(2000, root / "raw")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(data_store, "base_path", root)
+        pipeline.run(root / "raw", root / "store", write_csv=True)
+    return root
+
+
+@pytest.fixture(params=["pipeline", "orders_only"])
+def csv_only(request, csv_files, tmp_path, monkeypatch):
+    """A dashboard without a Parquet store, reading only the CSV files."""
+    for name in ("all_data", "rfm_data"):
+        frame = pd.read_csv(csv_files / f"{name}.csv")
+        if name == "all_data" and request.param == "orders_only":
+            frame = frame[ORDER_COLUMNS]
+        frame.to_csv(tmp_path / f"{name}.csv", index=False)
+    monkeypatch.setattr(data_store, "base_path", tmp_path)
+    monkeypatch.setattr(data_store, "STORE_PATH", tmp_path / "store")
+    monkeypatch.setenv("DASHBOARD_REFRESH_SECONDS", "0")
+    monkeypatch.setenv("DASHBOARD_RENDER_WORKERS", "0")
+    # The data snapshot and rendered charts are held per process, start from the files above
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    yield request.param
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def test_csv_fallback_loads_every_view(csv_only):
+    for view in VIEWS:
+        at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+        at.query_params["view"] = view
+        at.run()
+        assert not at.exception, (view, [exception.value for exception in at.exception])
+        assert at.header, view
+    assert not (data_store.STORE_PATH / "cube").exists()
+
+
+def test_csv_fallback_drilldown(csv_only):
+    at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+    at.query_params["view"] = "tab5"
+    at.run()
+    at.selectbox(key="drilldown_state").set_value("SP").run()
+    assert not at.exception, [exception.value for exception in at.exception]
+    if csv_only == "pipeline":
+        # The pipeline's all_data.csv has the item columns the drill-down tables are built from
+        assert len(at.dataframe) == 4
+        assert at.dataframe[0].value["orders"].sum() > 0
+    else:
+        # Without them the drill-down is left out, the rest of the view still loads
+        assert len(at.dataframe) == 0
+        assert at.info
+
+
+def test_charts_render_in_worker_processes(csv_only, monkeypatch):
+    # The workers are spawned from inside the script run, where the app is the __main__ module
+    monkeypatch.setenv("DASHBOARD_RENDER_WORKERS", "1")
+    for view in ["tab1", "tab6"]:
+        at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+        at.query_params["view"] = view
+        at.run()
+        assert not at.exception, (view, [exception.value for exception in at.exception])
+        assert len(at.get("imgs")) == 1, view
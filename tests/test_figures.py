@@ -0,0 +1,98 @@
+import sys
+import types
+
+import pytest
+
+import figures
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+SEGMENTS = ([120, 30, 6, 1], "2018")
+
+
+@pytest.fixture
+def render_service():
+    service = figures.RenderService(figures.FigureCache(), workers=1).start()
+    yield service
+    service.shutdown()
+
+
+def test_pool_renders_through_the_cache(render_service):
+    image = render_service.render(("tab6", 2018), figures.segmentation_chart, *SEGMENTS)
+    assert image.startswith(PNG_SIGNATURE)
+    assert render_service.render(("tab6", 2018), figures.segmentation_chart, *SEGMENTS) is image
+    assert (render_service.cache.misses, render_service.cache.hits) == (1, 1)
+
+
+def test_workers_do_not_run_the_app(tmp_path, monkeypatch):
+    # Under `streamlit run` the app is the __main__ module, see figures._WorkerProcess
+    app = tmp_path / "app.py"
+    app.write_text("import pathlib\npathlib.Path(__file__).with_suffix('.ran').touch()\n")
+    app_main = types.ModuleType("__main__")
+    app_main.__file__ = str(app)
+    monkeypatch.setitem(sys.modules, "__main__", app_main)
+
+    service = figures.RenderService(figures.FigureCache(), workers=1).start()
+    try:
+        assert service.render(("tab6", 2018), figures.segmentation_chart, *SEGMENTS).startswith(PNG_SIGNATURE)
+    finally:
+        service.shutdown()
+    assert sys.modules["__main__"] is app_main
+    assert not app.with_suffix(".ran").exists()
+
+
+def test_broken_pool_falls_back_to_rendering_in_process(render_service):
+    render_service.render(("tab6", 2018), figures.segmentation_chart, *SEGMENTS)
+    # A worker killed, e.g. for memory, breaks the whole pool
+    for process in list(render_service._pool._processes.values()):
+        process.kill()
+        process.join()
+
+    image = render_service.render(("tab6", 2017), figures.segmentation_chart, [5, 1, 0, 0], "2017")
+    assert image.startswith(PNG_SIGNATURE)
+    assert render_service.cache.get((("tab6", 2017), "png")) is image
+    # The next chart starts a new pool
+    assert render_service._pool is None
+    assert render_service.render(("tab6", 2016), figures.segmentation_chart, [1, 0, 0, 0], "2016")
+    assert render_service._pool is not None
+
+
+def test_without_workers_renders_in_process():
+    service = figures.RenderService(figures.FigureCache(), workers=0).start()
+    assert service.render(("tab6", 2018), figures.segmentation_chart, *SEGMENTS).startswith(PNG_SIGNATURE)
+    assert service._pool is None
+
+
+def test_figure_cache_evicts_least_recently_used_beyond_max_bytes():
+    cache = figures.FigureCache(max_bytes=250)
+    for name in ("a", "b", "c"):
+        cache.put(name, bytes(100))
+    # "c" pushed the total to 300 bytes, evicting the oldest image
+    assert cache.get("a") is None
+    assert cache.total_bytes == 200
+    # Reading "b" makes it the most recently used, so "c" goes next
+    assert cache.get("b") is not None
+    cache.put("d", bytes(100))
+    assert (cache.get("c"), cache.get("b") is not None, cache.get("d") is not None) == (None, True, True)
+    assert cache.total_bytes == 200
+
+
+def test_figure_cache_evicts_beyond_max_entries():
+    cache = figures.FigureCache(max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.put(name, b"png")
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    assert cache.total_bytes == 6
+
+
+def test_figure_cache_replaces_and_discards():
+    cache = figures.FigureCache(max_bytes=1000)
+    cache.put(("tab1", 1), bytes(100))
+    cache.put(("tab1", 1), bytes(300))
+    cache.put(("tab1", 2), bytes(50))
+    assert (len(cache), cache.total_bytes) == (2, 350)
+    # An image larger than the whole cache is not kept
+    cache.put(("tab2", 2), bytes(2000))
+    assert cache.get(("tab2", 2)) is None
+    cache.discard(lambda key: key[-1] != 2)
+    assert (len(cache), cache.total_bytes) == (1, 50)
@@ -0,0 +1,95 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+import cube
+import data_store
+import pipeline
+import synthetic_data
+from conftest import BATCH_ORDERS, ORDERS, write_tables
+from rfm import RFM_COLUMNS, read_rfm
+
+
+def _no_rebuild(*args, **kwargs):
+    raise AssertionError("the cube was rebuilt")
+
+
+@pytest.fixture(scope="module")
+def appended_and_rebuilt(tmp_path_factory):
+    """Two stores of the same orders: one built from the first ``ORDERS`` and appended a batch, one built at once."""
+    root = tmp_path_factory.mktemp("append")
+    # One chunk per ORDERS orders, so the last chunk of the full data is exactly the batch
+    synthetic_data.generate(ORDERS + BATCH_ORDERS, root / "full", chunk_size=ORDERS)
+    synthetic_data.generate(ORDERS, root / "base")
+    products, sellers = synthetic_data.load_reference_ids()
+    batch = synthetic_data.generate_chunk(ORDERS, ORDERS + BATCH_ORDERS, products, sellers)
+    write_tables({name: batch[name] for name in pipeline.DELTA_TABLES}, root / "batch")
+
+    pipeline.run(root / "base", root / "appended")
+    with pytest.MonkeyPatch.context() as patch:
+        # The append has to update the stored cube, not rebuild it
+        patch.setattr(cube, "build_cube", _no_rebuild)
+        pipeline.append(root / "batch", root / "appended")
+    pipeline.run(root / "full", root / "rebuilt")
+    return root / "appended", root / "rebuilt"
+
+
+def _sorted(frame, keys):
+    return frame.sort_values(keys).reset_index(drop=True)
+
+
+def test_append_matches_full_rebuild_of_rfm_data(appended_and_rebuilt):
+    appended, rebuilt = [_sorted(read_rfm(store_path=store), ["customer_unique_id", "year", "quarter"])
+                         for store in appended_and_rebuilt]
+    assert len(appended) > 0
+    pd.testing.assert_frame_equal(appended[RFM_COLUMNS], rebuilt[RFM_COLUMNS], check_dtype=False)
+
+
+@pytest.mark.parametrize("table", ["orders", "delivery", "recency", "monetary", *cube.DRILLDOWN_TABLES])
+def test_append_matches_full_rebuild_of_cube(appended_and_rebuilt, table):
+    keys, _ = cube.CUBE_TABLES[table]
+    appended, rebuilt = [cube.read_cube(store)[table] for store in appended_and_rebuilt]
+    appended, rebuilt = [_sorted(frame.astype({key: "string" for key in keys}), keys)
+                         for frame in (appended, rebuilt)]
+    pd.testing.assert_frame_equal(appended, rebuilt, check_dtype=False, check_categorical=False)
+
+
+def test_append_keeps_customer_codes_consistent(appended_and_rebuilt):
+    # Customers are numbered differently after an append, compare the index by customer id
+    indexes = []
+    for store in appended_and_rebuilt:
+        customer_ids = pd.read_parquet(cube.cube_path(store) / f"{cube.CUSTOMER_CODES}.parquet")["customer_unique_id"]
+        index = cube.read_cube(store)["customer_orders"]
+        index = index.assign(customer=customer_ids.to_numpy()[index["customer"]])
+        indexes.append(_sorted(index, ["customer", "year", "quarter"]))
+    pd.testing.assert_frame_equal(*indexes)
+
+    appended, rebuilt = [cube.read_cube(store) for store in appended_and_rebuilt]
+    years = cube.cube_years(rebuilt)
+    pd.testing.assert_series_equal(cube.frequency_counts(appended, years), cube.frequency_counts(rebuilt, years))
+
+
+def _store_version(store):
+    # The raw tables the batch is appended to, and everything derived from them
+    return data_store.data_version([*pipeline.DELTA_TABLES, "all_data", "rfm_data", "cube"], store_path=store)
+
+
+def test_append_without_orders_leaves_the_store_unchanged(synthetic_store, tmp_path):
+    store = shutil.copytree(synthetic_store, tmp_path / "store")
+    products, sellers = synthetic_data.load_reference_ids()
+    batch = synthetic_data.generate_chunk(ORDERS, ORDERS + BATCH_ORDERS, products, sellers)
+    write_tables({name: batch[name] for name in pipeline.DELTA_TABLES if name != "olist_orders_dataset"},
+                 tmp_path / "batch")
+    version = _store_version(store)
+    with pytest.raises(FileNotFoundError, match="olist_orders_dataset.csv"):
+        pipeline.append(tmp_path / "batch", store)
+    assert _store_version(store) == version
+
+
+def test_append_rejects_a_batch_appended_before(appended_and_rebuilt):
+    appended, _ = appended_and_rebuilt
+    version = _store_version(appended)
+    with pytest.raises(ValueError, match=f"{BATCH_ORDERS} orders of the batch"):
+        pipeline.append(appended.parent / "batch", appended)
+    assert _store_version(appended) == version
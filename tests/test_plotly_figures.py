@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from plotly_figures import MAX_POINTS, lttb
+
+
+def test_lttb_keeps_short_series_unchanged():
+    x, y = np.arange(10.0), np.arange(10.0) ** 2
+    sampled_x, sampled_y = lttb(x, y, threshold=10)
+    assert np.array_equal(sampled_x, x) and np.array_equal(sampled_y, y)
+    # Fewer than three points can't keep both ends and a point in between
+    assert len(lttb(x, y, threshold=2)[0]) == 10
+
+
+@pytest.mark.parametrize("threshold", [3, 100, MAX_POINTS])
+def test_lttb_keeps_threshold_points_of_the_series(threshold):
+    rng = np.random.default_rng(0)
+    x = np.arange(20_000.0)
+    y = rng.lognormal(3, 1, x.size)
+    sampled_x, sampled_y = lttb(x, y, threshold)
+    assert len(sampled_x) == threshold
+    assert (sampled_x[0], sampled_x[-1]) == (x[0], x[-1])
+    assert np.all(np.diff(sampled_x) > 0)
+    # Every kept point is a point of the series
+    assert np.array_equal(sampled_y, y[sampled_x.astype(int)])
+
+
+def test_lttb_keeps_peaks():
+    y = np.zeros(5_000)
+    y[[1_234, 3_210]] = [50.0, -20.0]
+    sampled_x, sampled_y = lttb(np.arange(y.size), y, threshold=50)
+    assert {1_234, 3_210} <= set(sampled_x.astype(int))
+    assert (sampled_y.max(), sampled_y.min()) == (50.0, -20.0)
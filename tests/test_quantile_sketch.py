@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import quantile_sketch
+from quantile_sketch import ALPHA
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+def _within_alpha(approximate, exact):
+    # A little slack for the floating point error of the bucket boundaries
+    return np.all(np.abs(approximate - exact) <= ALPHA * np.abs(exact) * (1 + 1e-9))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_quantiles_within_alpha_of_exact(seed):
+    rng = np.random.default_rng(seed)
+    # Spread like customer spend: a long tail over several orders of magnitude, plus zeros
+    values = np.concatenate([rng.lognormal(4.4, 1.2, 20_000), np.zeros(50), [0.01, 13_440.0]])
+    approximate = quantile_sketch.sketch_quantiles(quantile_sketch.build_sketch(values), QUANTILES)
+    # sketch_quantiles reads the value at rank q * (n - 1), rounded down
+    exact = np.quantile(values, QUANTILES, method="lower")
+    assert _within_alpha(approximate, exact)
+
+
+def test_merged_sketches_match_the_sketch_of_all_values():
+    rng = np.random.default_rng(0)
+    parts = [rng.lognormal(4.4, 0.9, size) for size in (1_000, 5_000, 1)]
+    merged = quantile_sketch.merge_sketches([quantile_sketch.build_sketch(part) for part in parts])
+    whole = quantile_sketch.build_sketch(np.concatenate(parts))
+    assert merged.sort_index().equals(whole.sort_index())
+    assert _within_alpha(quantile_sketch.sketch_quantiles(merged, QUANTILES),
+                         np.quantile(np.concatenate(parts), QUANTILES, method="lower"))
+
+
+def test_boxplot_stats_within_alpha_of_exact():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(4.4, 0.9, 10_000)
+    stats = quantile_sketch.sketch_boxplot_stats(quantile_sketch.build_sketch(values))
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75], method="lower")
+    assert _within_alpha(np.array([stats["q1"], stats["med"], stats["q3"]]), np.array([q1, median, q3]))
+    assert len(stats["fliers"]) <= quantile_sketch.MAX_FLIERS
+    # The extremes are drawn, either as a whisker end or as an outlier
+    drawn = np.concatenate([[stats["whislo"], stats["whishi"]], stats["fliers"]])
+    assert _within_alpha(np.array([drawn.min(), drawn.max()]), np.array([values.min(), values.max()]))
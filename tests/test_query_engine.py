@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import cube
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture(scope="module")
+def pandas_and_duckdb_cubes(synthetic_store):
+    return [cube.build_cube(synthetic_store, engine=engine) for engine in ("pandas", "duckdb")]
+
+
+def _normalized(frame, keys):
+    frame = frame.astype({key: "string" for key in keys if key not in cube.PERIOD_KEYS})
+    frame = frame.astype({key: "int64" for key in keys if key in cube.PERIOD_KEYS})
+    return frame.sort_values(keys).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("table", [table for table in cube.CUBE_TABLES if table != "customer_orders"])
+def test_pandas_and_duckdb_cubes_agree(pandas_and_duckdb_cubes, table):
+    keys, _ = cube.CUBE_TABLES[table]
+    pandas_table, duckdb_table = [_normalized(data_cube[table], keys) for data_cube in pandas_and_duckdb_cubes]
+    assert len(pandas_table) > 0
+    pd.testing.assert_frame_equal(pandas_table, duckdb_table, check_dtype=False)
+
+
+def test_pandas_and_duckdb_customer_orders_agree(pandas_and_duckdb_cubes):
+    # The engines number customers differently, compare the index by customer id
+    indexes = []
+    for data_cube in pandas_and_duckdb_cubes:
+        customer_ids = data_cube[cube.CUSTOMER_CODES]["customer_unique_id"].to_numpy()
+        index = data_cube["customer_orders"]
+        indexes.append(_normalized(index.assign(customer=customer_ids[index["customer"]]),
+                                   ["customer", "year", "quarter"]))
+    pd.testing.assert_frame_equal(*indexes)
@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import pytest
+
+import cube
+import data_store
+import refresher
+
+
+@pytest.fixture
+def store(synthetic_store, tmp_path):
+    """A copy of the synthetic store, so a test can change its data version."""
+    return shutil.copytree(synthetic_store, tmp_path / "store")
+
+
+@pytest.fixture
+def swaps():
+    return []
+
+
+@pytest.fixture
+def data_refresher(store, swaps):
+    return refresher.DataRefresher(store_path=store, interval=0, on_swap=swaps.append).start()
+
+
+def _change_version(store):
+    # A pipeline run rewrites the store; bump the modification time of a cube table instead
+    path = next(cube.cube_path(store).glob("*.parquet"))
+    mtime = data_store.data_version(store_path=store) + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+    return mtime
+
+
+def test_first_snapshot_is_loaded_on_start(data_refresher, swaps):
+    snapshot = data_refresher.current()
+    assert snapshot.generation == 1
+    assert snapshot.version == data_store.data_version(store_path=data_refresher.store_path)
+    assert swaps == [snapshot]
+    assert data_refresher.refresh() is False
+    assert data_refresher.current() is snapshot
+
+
+def test_swaps_once_the_version_settled(data_refresher, swaps):
+    first = data_refresher.current()
+    version = _change_version(data_refresher.store_path)
+    # The first poll that sees the change waits for the writer to finish
+    assert data_refresher.refresh() is False
+    assert data_refresher.current() is first
+    assert data_refresher.refresh() is True
+    second = data_refresher.current()
+    assert (second.generation, second.version) == (2, version)
+    assert swaps == [first, second]
+    assert data_refresher.refresh() is False
+
+
+def test_force_swaps_without_waiting(data_refresher, swaps):
+    version = _change_version(data_refresher.store_path)
+    assert data_refresher.refresh(force=True) is True
+    assert data_refresher.current().version == version
+    assert len(swaps) == 2
+
+
+def test_failed_load_keeps_the_old_snapshot(data_refresher, swaps, monkeypatch):
+    first = data_refresher.current()
+    _change_version(data_refresher.store_path)
+
+    def broken_load(generation, store_path=None):
+        raise OSError("partition still being written")
+
+    monkeypatch.setattr(refresher, "load_snapshot", broken_load)
+    assert data_refresher.refresh() is False
+    with pytest.warns(UserWarning, match="still serving version"):
+        assert data_refresher.refresh() is False
+    assert data_refresher.current() is first
+    assert isinstance(data_refresher.last_error, OSError)
+    assert swaps == [first]
+
+    # The next poll after the store is readable again swaps the new data in and clears the error
+    monkeypatch.undo()
+    assert data_refresher.refresh() is True
+    assert data_refresher.last_error is None
+    assert data_refresher.current().generation == 2
+
+
+
+def test_snapshot_tables_are_read_only(data_refresher):
+    snapshot = data_refresher.current()
+    with pytest.raises(ValueError, match="read-only"):
+        snapshot.cube["orders"].loc[0, "orders"] = 0
+    drilldown = next(iter(snapshot.drilldown["state_cities"].values()))
+    with pytest.raises(ValueError, match="read-only"):
+        drilldown.iloc[0, drilldown.columns.get_loc("orders")] = 0
@@ -0,0 +1,33 @@
+import pandas as pd
+
+import data_store
+import rfm
+
+
+def _direct_rfm(orders):
+    """rfm_data grouped straight from the joined order rows."""
+    timestamps = orders["order_purchase_timestamp"]
+    grouped = orders.assign(year=timestamps.dt.year, quarter=timestamps.dt.quarter).groupby(rfm.RFM_KEYS)
+    frame = grouped.agg(last_purchase=("order_purchase_timestamp", "max"),
+                        frequency=("order_id", "nunique"),
+                        monetary=("price", "sum")).reset_index()
+    frame["recency"] = (timestamps.max() - frame["last_purchase"]).dt.days
+    return frame
+
+
+def test_update_rfm_in_batches_matches_the_rfm_of_all_orders(synthetic_store, tmp_path):
+    orders = data_store.read_dataset(
+        "all_data", columns=["order_id", "customer_unique_id", "order_purchase_timestamp", "price"],
+        store_path=synthetic_store)
+    # Two batches of alternate orders, so the second one merges into every quarter the first wrote
+    order_ids = orders["order_id"].drop_duplicates()
+    first = orders["order_id"].isin(order_ids.iloc[::2])
+    assert rfm.update_rfm(orders[first], tmp_path) > 0
+    assert rfm.update_rfm(orders[~first], tmp_path) > 0
+
+    keys = rfm.RFM_KEYS
+    updated = rfm.read_rfm(store_path=tmp_path).sort_values(keys).reset_index(drop=True)
+    expected = _direct_rfm(orders).sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(updated[rfm.RFM_COLUMNS].astype({"customer_unique_id": "string"}),
+                                  expected[rfm.RFM_COLUMNS].astype({"customer_unique_id": "string"}),
+                                  check_dtype=False)
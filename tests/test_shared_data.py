@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from shared_data import freeze
+
+
+@pytest.fixture
+def frozen():
+    return freeze(pd.DataFrame({
+        "year": [2017, 2018],
+        "revenue": [10.5, 20.0],
+        "state": pd.array(["SP", "RJ"], dtype="string"),
+        "category": pd.Categorical(["toys", "books"]),
+    }))
+
+
+def _set_by_label(frame):
+    frame.loc[0, "year"] = 2016
+
+
+def _set_by_position(frame):
+    frame.iloc[1, 1] = 0.0
+
+
+def _set_through_numpy(frame):
+    frame["revenue"].to_numpy()[0] = 0.0
+
+
+@pytest.mark.parametrize("write", [_set_by_label, _set_by_position, _set_through_numpy])
+def test_writes_to_a_frozen_frame_raise(frozen, write):
+    with pytest.raises(ValueError, match="read-only"):
+        write(frozen)
+    assert frozen["year"].tolist() == [2017, 2018]
+    assert frozen["revenue"].tolist() == [10.5, 20.0]
+
+
+def test_frozen_frame_still_reads(frozen):
+    assert frozen.sort_values("year", ascending=False)["state"].tolist() == ["RJ", "SP"]
+    assert frozen.groupby("category", observed=True)["revenue"].sum().to_dict() == {"books": 20.0, "toys": 10.5}
+    # Copies are writeable again
+    copy = frozen.copy()
+    copy.loc[0, "year"] = 2016
+    assert frozen.loc[0, "year"] == 2017